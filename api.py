@@ -1,40 +1,98 @@
-from fastapi import FastAPI
-from backend.rag import rag_agent, set_retrieval_mode
-from backend.data_models import Prompt, QueryRequest, VideoMetadataResponse
-from backend.constants import VECTOR_DATABASE_PATH, GEMINI_MODELS, GEMINI_MODEL_KEY
-import lancedb
-from typing import Optional, List
-import uuid
+from fastapi import FastAPI, Path, Query, Request, Response
+from backend.rag import rag_agent, set_retrieval_mode, set_ann_profile, search_batcher, context_cache, warm_up_embeddings
+from backend.data_models import Prompt, QueryRequest, VideoMetadataResponse, MD_ID_PATTERN
+from backend.keyword_stats import load_keyword_stats
+from backend.constants import (
+    GEMINI_MODEL_KEY, NON_ACTIVE_GEMINI_MODELS, HISTORY_MAX_MESSAGES, RESPONSE_CACHE_TTL_SECONDS
+)
+from backend.db import get_vector_db, get_parent_table, get_parent_row, get_parent_version, refresh_tables, warm_up
+from backend import sessions
+from typing import Optional, List, Annotated
 from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic_ai.exceptions import ModelHTTPError
 from pydantic_ai.messages import UserPromptPart, ModelResponse, TextPart
 import time
-from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import functools
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
 
-app = FastAPI()
 
-# In-memory session storage for conversation history
-sessions = {}  # {session_id: [{"role": "user", "content": "..."}, ...]}
-SESSION_TTL_MINUTES = 60  # Clean up sessions older than 1 hour
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up LanceDB and the embedding client before traffic arrives so the first request isn't a cold start."""
+    try:
+        warm_up()
+    except Exception as e:
+        # Don't block startup (e.g. /health) if the knowledge base is missing
+        print(f"WARNING: LanceDB warm-up failed: {e}")
+    try:
+        await asyncio.to_thread(warm_up_embeddings)
+    except Exception as e:
+        print(f"WARNING: Embedding warm-up failed: {e}")
+    # Expire stale sessions off the request path
+    session_gc = asyncio.create_task(sessions.expire_sessions_periodically())
+    yield
+    session_gc.cancel()
+    try:
+        await session_gc
+    except asyncio.CancelledError:
+        pass
+    await search_batcher.close()
+    await sessions.close()
 
-def get_or_create_session() -> str:
-    """Create a new session ID for tracking conversation history"""
-    session_id = str(uuid.uuid4())
-    sessions[session_id] = {
-        "history": [], 
-        "created_at": time.time()  # Add this line
-    }
-    return session_id
 
-# Initialize unified vector database
-# vector_db = lancedb.connect(uri=VECTOR_DATABASE_PATH / "transcripts_unified")
-vector_db = None
+# orjson for every JSON response (list endpoints return sizeable payloads)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Metadata responses only change on ingestion, so browsers/CDNs may reuse them;
+# the ETag follows the parent_videos table version
+HTTP_CACHEABLE_PATHS = ("/videos", "/keywords", "/video/")
+HTTP_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=3600"
+
+@app.middleware("http")
+async def http_cache_headers(request: Request, call_next):
+    """Add Cache-Control/ETag to metadata responses and answer matching If-None-Match with 304."""
+    if request.method != "GET" or not request.url.path.startswith(HTTP_CACHEABLE_PATHS):
+        return await call_next(request)
+
+    # Cached next to the table handles (loaded by warm_up, reset by refresh_tables)
+    version = get_parent_version()
+    etag = '"' + hashlib.md5(f"{request.url.path}?{request.url.query}:{version}".encode()).hexdigest() + '"'
+    headers = {"Cache-Control": HTTP_CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+# Page size cap for /videos and /keywords (also the default, so existing clients get everything)
+MAX_PAGE_SIZE = 1000
 
-def get_vector_db():
-    global vector_db
-    if vector_db is None:
-        vector_db = lancedb.connect(uri=VECTOR_DATABASE_PATH / "transcripts_unified")
-    return vector_db
+# Video IDs are MD5 hex digests; validating them up front keeps the LanceDB filter
+# a constant-shape point query and keeps user input out of the predicate string.
+VideoId = Annotated[str, Path(pattern=MD_ID_PATTERN, description="MD5 hash identifier of the video")]
+
+# In-process cache for knowledge base listings (parent_videos only changes on ingestion)
+response_cache = TTLCache(maxsize=64, ttl=RESPONSE_CACHE_TTL_SECONDS)  # one entry per endpoint + page
+
+def cached_response(key: str):
+    """Serve an endpoint from `response_cache`, computing it only on a miss."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = (key, tuple(sorted(kwargs.items())))
+            if cache_key in response_cache:
+                return response_cache[cache_key]
+            result = await func(*args, **kwargs)
+            response_cache[cache_key] = result
+            return result
+        return wrapper
+    return decorator
 
 @app.get("/health")
 async def health_check():
@@ -47,41 +105,52 @@ async def hello_message():
         "message": "Welcome to YT RAG Assistant API",
         "instructions": "To get started, call /videos to see all available videos and their identifiers",
         "endpoints": {
-            "GET /videos": "List all available videos with their md_id (video identifier) and filename",
+            "GET /videos": "List available videos with their md_id (video identifier) and filename (supports ?offset=&limit=)",
             "GET /video/description/{md_id}": "Get the pre-generated YouTube description for a video",
             "GET /video/keywords/{md_id}": "Get the pre-generated YouTube keywords/tags for a video",
             "POST /session": "[LEGACY] Create a session (optional - history managed by frontend)",
             "GET /sessions": "[LEGACY] List sessions (optional - for compatibility)",
             "POST /query": "Query the RAG system with history from frontend (stateless)",
-            "POST /history": "Receive and return conversation history from frontend"
+            "POST /history": "Receive and return conversation history from frontend",
+            "POST /admin/cache/invalidate": "Drop cached /videos and /keywords responses (call after ingestion)"
         }
     }
 
 @app.post("/session")
 async def create_session() -> dict:
     """Create a new conversation session and return session ID"""
-    session_id = get_or_create_session()
+    session_id = await sessions.create_session()
     return {"session_id": session_id}
 
 @app.get("/sessions")
 async def list_sessions() -> dict:
     """List all active session IDs"""
+    session_ids = await sessions.list_session_ids()
     return {
-        "count": len(sessions),
-        "sessions": list(sessions.keys())
+        "count": len(session_ids),
+        "sessions": session_ids
     }
 
-@app.get("/videos")
-async def list_all_videos():
+@app.get("/videos", response_model=None)
+@cached_response("videos")
+async def list_all_videos(offset: int = Query(0, ge=0), limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
     """
-    Get a list of all available videos in the knowledge base.
+    Get a page of the available videos in the knowledge base.
+    
+    Args:
+        offset: Number of videos to skip
+        limit: Maximum number of videos to return
     
     Returns:
-        List of videos with their md_id (video identifier) and filename
+        Total video count and the requested page of videos with their md_id (video identifier) and filename
     """
-    db = get_vector_db()
-    parent_table = db["parent_videos"]
-    results = parent_table.search().limit(1000).to_list()
+    def load_page():
+        parent_table = get_parent_table()
+        results = parent_table.search().select(["md_id", "filename"]).offset(offset).limit(limit).to_list()
+        return parent_table.count_rows(), results
+
+    # LanceDB's sync API would block the event loop, so run it in a worker thread
+    total, results = await asyncio.to_thread(load_page)
     
     videos = [
         {
@@ -91,69 +160,86 @@ async def list_all_videos():
         for r in results
     ]
     
-    return {
-        "total": len(videos),
+    # Returning the response directly skips FastAPI's jsonable_encoder pass; the cached
+    # response keeps the already-serialized body
+    return ORJSONResponse({
+        "total": total,
+        "offset": offset,
+        "limit": limit,
         "videos": videos
-    }
+    })
 
-@app.get("/keywords")
-async def list_all_keywords():
+@app.get("/keywords", response_model=None)
+@cached_response("keywords")
+async def list_all_keywords(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    top_k: Optional[int] = Query(None, ge=1)
+):
     """
-    Get a list of all unique keywords from all videos in the knowledge base.
+    Get a page of the unique keywords from all videos in the knowledge base.
+    
+    Args:
+        offset: Number of keywords to skip
+        limit: Maximum number of keywords to return
+        top_k: Only consider the K most frequent keywords
     
     Returns:
-        Sorted list of unique keywords with their frequency count
+        Total unique keyword count and the requested page of keywords (sorted by frequency) with their count
     """
-    db = get_vector_db()
-    parent_table = db["parent_videos"]
-    results = parent_table.search().limit(1000).to_list()
-    
-    keyword_counts = {}
-    
-    for r in results:
-        keywords_str = r.get("keywords", "")
-        if keywords_str:
-            # Split by comma and clean up whitespace
-            keywords = [k.strip() for k in keywords_str.split(",") if k.strip()]
-            for keyword in keywords:
-                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
-    
-    # Sort by count (descending), then alphabetically
-    sorted_keywords = sorted(
-        keyword_counts.items(),
-        key=lambda x: (-x[1], x[0])
-    )
+    # Only the first offset + limit keywords can appear on this page, so select just those
+    needed = offset + limit if top_k is None else min(top_k, offset + limit)
+    total, keywords = await asyncio.to_thread(lambda: load_keyword_stats(get_vector_db(), top_k=needed))
     
-    return {
-        "total_unique_keywords": len(keyword_counts),
-        "keywords": [
-            {"keyword": k, "count": c}
-            for k, c in sorted_keywords
-        ]
-    }
+    return ORJSONResponse({
+        "total_unique_keywords": total,
+        "offset": offset,
+        "limit": limit,
+        "keywords": keywords[offset:offset + limit]
+    })
+
+@app.post("/admin/cache/invalidate")
+async def invalidate_cache() -> dict:
+    """Clear cached knowledge base listings and retrieval contexts so the next request re-reads LanceDB."""
+    cleared = len(response_cache)
+    response_cache.clear()
+    context_cache.clear()
+    refresh_tables()
+    return {"message": "Response cache cleared", "cleared": cleared}
 
 @app.post("/rag/query")
 async def query_documentation(query: Prompt):
     # Set retrieval mode based on user input
     set_retrieval_mode(query.retrieval_mode)
+    set_ann_profile(query.ann_profile)
     
     result = await rag_agent.run(query.prompt)
 
     return result.output
 
+# Frontend history role -> agent message builder (unknown roles are skipped)
+ROLE_BUILDERS = {
+    "user": lambda content: UserPromptPart(content=content),
+    # Handle both 'assistant' (from frontend) and 'model' (legacy)
+    "assistant": lambda content: ModelResponse(parts=[TextPart(content=content)]),
+    "model": lambda content: ModelResponse(parts=[TextPart(content=content)]),
+}
+
 @app.post("/query")
 async def query_rag(request: QueryRequest):
     """Query RAG with history from frontend (stateless approach)"""
-    set_retrieval_mode(request.retrieval_mode)
-    
     # Convert history from frontend to proper message format for the agent
-    message_history = []
-    for msg in request.history:
-        if msg["role"] == "user":
-            message_history.append(UserPromptPart(content=msg["content"]))
-        elif msg["role"] == "assistant" or msg["role"] == "model":
-            # Handle both 'assistant' (from frontend) and 'model' (legacy)
-            message_history.append(ModelResponse(parts=[TextPart(content=msg["content"])]))
+    message_history = [
+        ROLE_BUILDERS[msg["role"]](msg["content"])
+        for msg in request.history[-HISTORY_MAX_MESSAGES:]
+        if msg["role"] in ROLE_BUILDERS
+    ]
+    
+    # Agent runs are not batched: pydantic-ai has no batch API, so concurrent requests already
+    # overlap, and awaiting the run here cancels it when the client disconnects.
+    # Retrieval settings are per-request context (ContextVars), not shared state.
+    set_retrieval_mode(request.retrieval_mode)
+    set_ann_profile(request.ann_profile)
     
     # Run Agent with 429 error handling
     try:
@@ -162,7 +248,7 @@ async def query_rag(request: QueryRequest):
         if e.status_code == 429:
             # Quota exceeded: provide helpful fallback guidance
             current_model = GEMINI_MODEL_KEY
-            available_high_quota = [k for k, v in GEMINI_MODELS.items() if k != current_model]
+            available_high_quota = NON_ACTIVE_GEMINI_MODELS
             raise HTTPException(
                 status_code=429,
                 detail=f"Quota exceeded for model '{current_model}'. "
@@ -176,7 +262,7 @@ async def query_rag(request: QueryRequest):
     return result.output
 
 @app.get("/video/description/{video_id}")
-async def get_video_description(video_id: str):
+async def get_video_description(video_id: VideoId):
     """
     Get YouTube description (summary) for a video by its ID.
     
@@ -186,22 +272,20 @@ async def get_video_description(video_id: str):
     Returns:
         VideoMetadataResponse with summary field populated
     """
-    # Retrieve the transcript from parent_videos table
-    db = get_vector_db()
-    parent_table = db["parent_videos"]
-    results = parent_table.search().where(f"md_id = '{video_id}'").to_list()
+    # Retrieve the video's metadata from parent_videos table (the transcript itself is not needed)
+    result = await asyncio.to_thread(get_parent_row, video_id, ["md_id", "filename", "summary"])
     
-    if not results:
-        return {"error": f"Video with ID {video_id} not found"}
+    if result is None:
+        # A 404 never gets the cache headers, so it isn't reused once the video is ingested
+        raise HTTPException(status_code=404, detail=f"Video with ID {video_id} not found")
     
-    result = results[0]
     filename = result.get("filename", "Unknown")
-    content = result.get("content", "")
     
     # Return the pre-generated summary from the database
+    # (model_construct skips validation: the fields come from typed LanceDB columns)
     summary = result.get("summary", "")
     
-    return VideoMetadataResponse(
+    return VideoMetadataResponse.model_construct(
         md_id=video_id,
         filename=filename,
         summary=summary,
@@ -209,7 +293,7 @@ async def get_video_description(video_id: str):
     )
 
 @app.get("/video/keywords/{video_id}")
-async def get_video_keywords(video_id: str):
+async def get_video_keywords(video_id: VideoId):
     """
     Get YouTube keywords/tags for a video by its ID.
     
@@ -219,21 +303,20 @@ async def get_video_keywords(video_id: str):
     Returns:
         VideoMetadataResponse with keywords field populated (comma-separated)
     """
-    # Retrieve the transcript from parent_videos table
-    db = get_vector_db()
-    parent_table = db["parent_videos"]
-    results = parent_table.search().where(f"md_id = '{video_id}'").to_list()
+    # Retrieve the video's metadata from parent_videos table (the transcript itself is not needed)
+    result = await asyncio.to_thread(get_parent_row, video_id, ["md_id", "filename", "keywords"])
     
-    if not results:
-        return {"error": f"Video with ID {video_id} not found"}
+    if result is None:
+        # A 404 never gets the cache headers, so it isn't reused once the video is ingested
+        raise HTTPException(status_code=404, detail=f"Video with ID {video_id} not found")
     
-    result = results[0]
     filename = result.get("filename", "Unknown")
     
     # Return the pre-generated keywords from the database
+    # (model_construct skips validation: the fields come from typed LanceDB columns)
     keywords = result.get("keywords", "")
     
-    return VideoMetadataResponse(
+    return VideoMetadataResponse.model_construct(
         md_id=video_id,
         filename=filename,
         summary="",
@@ -256,19 +339,6 @@ async def receive_history(request: dict) -> dict:
 @app.post("/session/{session_id}/clear")
 async def clear_session(session_id: str):
     """Manually clear a session"""
-    if session_id in sessions:
-        del sessions[session_id]
+    if await sessions.delete_session(session_id):
         return {"message": f"Session {session_id} cleared"}
     return {"message": f"Session {session_id} not found"}
-
-
-def cleanup_old_sessions():
-    """Remove sessions older than SESSION_TTL_MINUTES"""
-    current_time = time.time()
-    expired_sessions = [
-        sid for sid, data in sessions.items()
-        if current_time - data["created_at"] > SESSION_TTL_MINUTES * 60
-    ]
-    for sid in expired_sessions:
-        del sessions[sid]
-    return len(expired_sessions)
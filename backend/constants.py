@@ -52,5 +52,44 @@ GEMINI_MODEL_KEY = os.getenv("GEMINI_MODEL_KEY", "flash-lite")
 # This is what gets passed to the PydanticAI Agent.
 LLM_MODEL_NAME = GEMINI_MODELS.get(GEMINI_MODEL_KEY, GEMINI_MODELS["flash-lite"])
 
+# Model keys other than the active one, suggested as fallbacks when the quota is exceeded
+NON_ACTIVE_GEMINI_MODELS = [k for k in GEMINI_MODELS if k != GEMINI_MODEL_KEY]
+
 # Embedding Configuration
-EMBEDDING_MODEL_NAME = "text-embedding-004"
\ No newline at end of file
+EMBEDDING_MODEL_NAME = "text-embedding-004"
+EMBEDDING_DIM_GEMINI = 768  # text-embedding-004 is 768-dim
+
+# Conversation history window: only the most recent messages are kept / sent to the LLM
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "64"))
+
+# Vector-search micro-batching: retrieval tool calls arriving within SEARCH_BATCH_WAIT_MS
+# share one multi-vector LanceDB query (up to SEARCH_BATCH_SIZE queries per batch).
+SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "16"))
+SEARCH_BATCH_WAIT_MS = float(os.getenv("SEARCH_BATCH_WAIT_MS", "10"))
+
+# Retrieval context cache: formatted tool results keyed on the normalized query text,
+# so repeated questions skip the embedding call and the vector scan.
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "1024"))
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+
+# Per-result cap on the transcript text placed in the LLM context (0 = no cap).
+# Mostly matters for "whole" retrieval, where each result is a full transcript.
+CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", "0"))
+
+# How stale the API may be after a re-ingestion: cached listings expire, and table handles
+# re-check for newer versions, after this many seconds (POST /admin/cache/invalidate: at once)
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+# Optional Redis URL for the legacy /session store (shared across workers).
+# Unset: sessions are kept in a per-process TTL cache.
+REDIS_URL = os.getenv("REDIS_URL")
+
+# ANN search profiles: trade recall for latency on IVF-indexed tables.
+# nprobes = IVF partitions scanned; refine_factor = candidates per result re-ranked in-process
+# with exact float32 cosine (see backend.rag.search_batch).
+ANN_PROFILES = {
+    "fast": {"nprobes": 8, "refine_factor": 1},
+    "balanced": {"nprobes": 20, "refine_factor": 5},
+    "recall_max": {"nprobes": 50, "refine_factor": 10},
+}
+DEFAULT_ANN_PROFILE = "balanced"
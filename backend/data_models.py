@@ -3,18 +3,18 @@
 Defines LanceDB schemas for embedding providers and ingestion strategies:
 - TranscriptGeminiWhole: Gemini embeddings (768-dim), whole-document
 - TranscriptGeminiChunk: Two-stream chunk model (raw + cleaned versions)
+- KeywordStat: precomputed keyword frequency across all videos
 Shared models:
 - Prompt: user query input
 - RagResponse: structured LLM response with sources
 """
+import pyarrow as pa
 from pydantic import BaseModel, Field
 from lancedb.embeddings import get_registry
 from lancedb.pydantic import LanceModel, Vector
-from dotenv import load_dotenv
-from typing import Optional
-from backend.constants import EMBEDDING_MODEL_NAME
-
-load_dotenv()
+from typing import Optional, Literal
+# backend.constants loads .env once on import (before the embedding model reads GOOGLE_API_KEY)
+from backend.constants import EMBEDDING_MODEL_NAME, EMBEDDING_DIM_GEMINI
 
 # Gemini embedding setup
 try:
@@ -26,7 +26,9 @@ except Exception as e:
     # However, printing the error helps debugging in Log Stream.
     raise
 
-EMBEDDING_DIM_GEMINI = 768  # text-embedding-004 is 768-dim
+EMBEDDING_BIN_BYTES = EMBEDDING_DIM_GEMINI // 8  # sign bits of the embedding, packed 8 per byte
+MD_ID_PATTERN = r"^[0-9a-f]{32}$"  # md_id is the MD5 hex digest of the filename
+AnnProfile = Literal["fast", "balanced", "recall_max"]  # keys of constants.ANN_PROFILES
 
 
 class TranscriptGeminiWhole(LanceModel):
@@ -39,9 +41,11 @@ class TranscriptGeminiWhole(LanceModel):
     filepath: str
     filename: str = Field(description="stem of the file without suffix")
     content: str = embedding_model.SourceField()
+    content_hash: Optional[str] = Field(default=None, description="BLAKE2b of content; unchanged files are skipped on re-ingestion")
     summary: str = Field(description="summary of the video based on whole stranscipt")
     keywords: str = Field(description="stores 20-40 keywords about a particular video")
     embedding: Optional[Vector(EMBEDDING_DIM_GEMINI)] = embedding_model.VectorField(default=None)
+    embedding_bin: Optional[Vector(EMBEDDING_BIN_BYTES, value_type=pa.uint8())] = Field(default=None, description="binary-quantized embedding for Hamming prefilter")
     embedding_model: str = Field(default=EMBEDDING_MODEL_NAME)
     embedding_provider: str = Field(default="google-generativeai")
     embedding_dim: int = Field(default=EMBEDDING_DIM_GEMINI)
@@ -51,25 +55,35 @@ class TranscriptGeminiChunk(LanceModel):
     """Two-stream chunk: raw (for vector) + cleaned (for LLM)."""
     md_id: str
     chunk_id: int
+    filename: Optional[str] = Field(default=None, description="parent video filename, denormalized for citations")
     raw_content: str = embedding_model.SourceField()   # used for embeddings
     cleaned_content: str = Field(description="Heavily cleaned for LLM context")
     token_count: int = Field(description="Approximate token count from tiktoken")
     embedding: Optional[Vector(EMBEDDING_DIM_GEMINI)] = embedding_model.VectorField(default=None)
+    embedding_bin: Optional[Vector(EMBEDDING_BIN_BYTES, value_type=pa.uint8())] = Field(default=None, description="binary-quantized embedding for Hamming prefilter")
     embedding_model: str = Field(default=EMBEDDING_MODEL_NAME)
     embedding_provider: str = Field(default="google-genai")
     embedding_dim: int = Field(default=EMBEDDING_DIM_GEMINI)
 
 
+class KeywordStat(LanceModel):
+    """Keyword frequency across parent_videos, materialized at ingestion time."""
+    keyword: str
+    count: int
+
+
 class Prompt(BaseModel):
     """User query input for RAG system."""
     prompt: str = Field(description="prompt from user, if empty consider it as missing")
     retrieval_mode: str = Field(default="chunked", description="'chunked' for granular results or 'whole' for full document context")
+    ann_profile: AnnProfile = Field(default="balanced", description="ANN search profile: 'fast', 'balanced' or 'recall_max'")
 
 
 class QueryRequest(BaseModel):
     """Request model for RAG query with history from frontend (stateless)."""
     query: str = Field(description="user question")
     retrieval_mode: str = Field(default="chunked", description="'chunked' or 'whole'")
+    ann_profile: AnnProfile = Field(default="balanced", description="'fast', 'balanced' or 'recall_max'")
     history: list[dict] = Field(default=[], description="conversation history from frontend") 
 
 
@@ -0,0 +1,134 @@
+"""Shared LanceDB connection and table handles.
+
+The API and the RAG agent both read from the same unified database, so they share
+one lazily opened connection and reuse opened table handles across requests.
+"""
+import threading
+import time
+from datetime import timedelta
+import lancedb
+# constants only (not data_models), so read-only scripts never initialize the embedding client
+from backend.constants import VECTOR_DATABASE_PATH, EMBEDDING_DIM_GEMINI, RESPONSE_CACHE_TTL_SECONDS
+
+# Lazy loading to prevent import-time errors
+vector_db = None
+_vector_db_lock = threading.Lock()
+_tables = {}  # table name -> opened table handle
+_indexed_columns = {}  # table name -> set of columns that have an index
+_parent_version = None  # version of the parent_videos handle being served
+_derived_loaded_at = 0.0  # monotonic time the values above were last reset
+
+# md_id -> small metadata columns of parent_videos (the table has one row per video,
+# so this stays small; transcripts/embeddings are never loaded here)
+PARENT_INDEX_COLUMNS = ["md_id", "filename", "summary", "keywords"]
+_parent_index = None
+_parent_index_lock = threading.Lock()
+
+
+def get_vector_db():
+    """Return the shared connection, opening it once per process (safe under concurrent first calls)."""
+    global vector_db
+    if vector_db is None:
+        with _vector_db_lock:
+            if vector_db is None:
+                # Cached table handles pick up a re-ingestion within the same window as the
+                # API's response cache
+                vector_db = lancedb.connect(
+                    uri=VECTOR_DATABASE_PATH / "transcripts_unified",
+                    read_consistency_interval=timedelta(seconds=RESPONSE_CACHE_TTL_SECONDS),
+                )
+    return vector_db
+
+
+def get_table(name: str):
+    """Return the named table, opening it once per process."""
+    table = _tables.get(name)
+    if table is None:
+        table = _tables[name] = get_vector_db()[name]
+    return table
+
+
+def _expire_derived():
+    """Drop values derived from the tables once per RESPONSE_CACHE_TTL_SECONDS, matching the handles."""
+    global _parent_index, _parent_version, _derived_loaded_at
+    now = time.monotonic()
+    if now - _derived_loaded_at >= RESPONSE_CACHE_TTL_SECONDS:
+        _indexed_columns.clear()
+        _parent_index = None
+        _parent_version = None
+        _derived_loaded_at = now
+
+
+def get_indexed_columns(name: str) -> set:
+    """Return the names of the indexed columns of a table (cached until expiry or refresh_tables)."""
+    _expire_derived()
+    columns = _indexed_columns.get(name)
+    if columns is None:
+        columns = _indexed_columns[name] = {c for index in get_table(name).list_indices() for c in index.columns}
+    return columns
+
+
+def get_parent_table():
+    """Return the parent_videos table, opening it once per process."""
+    return get_table("parent_videos")
+
+
+def get_parent_version() -> int:
+    """Return the version of the parent_videos handle (cached until expiry or refresh_tables)."""
+    global _parent_version
+    _expire_derived()
+    if _parent_version is None:
+        _parent_version = get_parent_table().version
+    return _parent_version
+
+
+def refresh_tables():
+    """Move cached table handles to the latest version (e.g. after re-ingestion)."""
+    global _parent_index, _parent_version, _derived_loaded_at
+    for table in _tables.values():
+        table.checkout_latest()
+    _indexed_columns.clear()
+    _parent_index = None
+    _parent_version = None
+    _derived_loaded_at = time.monotonic()
+    get_parent_version()
+
+
+def warm_up():
+    """Open the connection and tables, read one row and run one vector search so the
+    first request doesn't pay for it (index metadata is loaded on first search)."""
+    get_parent_table().search().select(["md_id"]).limit(1).to_list()
+    get_parent_version()
+    get_table("video_chunks").search([0.0] * EMBEDDING_DIM_GEMINI, vector_column_name="embedding") \
+        .distance_type("dot").select(["chunk_id"]).limit(1).to_list()
+
+
+def get_parent_index() -> dict:
+    """Return the in-memory md_id -> metadata map, loading it on first use (and after expiry)."""
+    global _parent_index
+    _expire_derived()
+    if _parent_index is None:
+        with _parent_index_lock:
+            if _parent_index is None:
+                rows = get_parent_table().search().select(PARENT_INDEX_COLUMNS).limit(None) \
+                    .to_arrow().to_pylist()
+                _parent_index = {r["md_id"]: r for r in rows}
+    return _parent_index
+
+
+def get_parent_row(md_id: str, columns: list[str]):
+    """Look up one parent_videos row by md_id, projecting only `columns`.
+
+    Metadata columns are served from the in-memory index; anything else falls back
+    to a filtered LanceDB query (backed by the md_id scalar index).
+
+    Returns:
+        The row as a dict, or None if no video has this md_id
+    """
+    if set(columns) <= set(PARENT_INDEX_COLUMNS):
+        row = get_parent_index().get(md_id)
+        return {c: row[c] for c in columns} if row is not None else None
+
+    results = get_parent_table().search().where(f"md_id = '{md_id}'", prefilter=True) \
+        .select(columns).limit(1).to_list()
+    return results[0] if results else None
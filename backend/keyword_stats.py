@@ -0,0 +1,95 @@
+"""Keyword aggregation over the parent_videos table.
+
+The per-keyword counts are computed once at ingestion time and stored in the
+`keyword_stats` table, so `GET /keywords` only has to read the precomputed rows.
+"""
+from typing import Optional
+import lancedb
+import pyarrow as pa
+import pyarrow.compute as pc
+from backend.data_models import KeywordStat
+
+KEYWORD_STATS_TABLE = "keyword_stats"
+# Splitting on the comma and its surrounding whitespace strips each keyword in the same pass
+KEYWORD_SEPARATOR = r"\s*,\s*"
+# Rows per Arrow batch when scanning parent_videos.keywords
+SCAN_BATCH_SIZE = 256
+
+
+def _count_batch(keywords) -> pa.Table:
+    """Per-keyword counts for one Arrow array of comma-separated keyword strings."""
+    # Trim, split and flatten with Arrow compute kernels instead of a per-row Python loop
+    keywords = pc.utf8_trim_whitespace(keywords)
+    parts = pc.list_flatten(pc.split_pattern_regex(keywords, pattern=KEYWORD_SEPARATOR))
+    parts = pc.filter(parts, pc.not_equal(parts, ""))
+
+    counts = pc.value_counts(parts)
+    return pa.table({"keyword": counts.field("values"), "count": counts.field("counts")})
+
+
+KEYWORD_SORT_KEYS = [("count", "descending"), ("keyword", "ascending")]
+
+
+def _sorted_rows(stats: pa.Table, top_k: Optional[int] = None) -> list[dict]:
+    if top_k is not None and top_k < stats.num_rows:
+        # Partial top-K selection, then sort only the K survivors
+        stats = stats.take(pc.select_k_unstable(stats, k=top_k, sort_keys=KEYWORD_SORT_KEYS))
+    return stats.sort_by(KEYWORD_SORT_KEYS).to_pylist()
+
+
+def _aggregate(batches) -> pa.Table:
+    """Reduce each batch to per-keyword counts, then merge the partial counts."""
+    partials = [_count_batch(keywords) for keywords in batches]
+    if not partials:
+        return pa.table({"keyword": pa.array([], pa.string()), "count": pa.array([], pa.int64())})
+
+    merged = pa.concat_tables(partials).group_by("keyword").aggregate([("count", "sum")])
+    return pa.table({"keyword": merged["keyword"], "count": merged["count_sum"]})
+
+
+def count_keywords(batches) -> list[dict]:
+    """Count comma-separated keywords and return rows sorted by count (desc), then keyword.
+
+    Args:
+        batches: iterable of Arrow arrays of comma-separated keyword strings
+    """
+    return _sorted_rows(_aggregate(batches))
+
+
+def scan_keywords(table, batch_size: int = SCAN_BATCH_SIZE):
+    """Stream the keywords column of a parent_videos table in Arrow batches."""
+    reader = table.search().select(["keywords"]).limit(None).to_batches(batch_size)
+    for batch in reader:
+        yield batch.column("keywords")
+
+
+def load_keyword_stats(db: lancedb.DBConnection, top_k: Optional[int] = None) -> tuple[int, list[dict]]:
+    """Read keyword counts, sorted by count (desc), then keyword.
+
+    Args:
+        top_k: Only return the K most frequent keywords (skips sorting the rest)
+
+    Returns:
+        Total number of unique keywords, and the (top-K) sorted rows
+    """
+    if KEYWORD_STATS_TABLE in db.list_tables().tables:
+        # Counts were materialized at ingestion time
+        stats = db[KEYWORD_STATS_TABLE].search().select(["keyword", "count"]).limit(None).to_arrow()
+    else:
+        # Knowledge base built before keyword_stats existed: aggregate on the fly
+        stats = _aggregate(scan_keywords(db["parent_videos"]))
+    return stats.num_rows, _sorted_rows(stats, top_k)
+
+
+def build_keyword_stats(db: lancedb.DBConnection) -> int:
+    """Recompute keyword counts from parent_videos and overwrite the keyword_stats table.
+
+    Returns:
+        Number of unique keywords written
+    """
+    rows = count_keywords(scan_keywords(db["parent_videos"]))
+
+    stats_table = db.create_table(KEYWORD_STATS_TABLE, schema=KeywordStat, mode="overwrite")
+    if rows:
+        stats_table.add(rows)
+    return len(rows)
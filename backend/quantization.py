@@ -0,0 +1,43 @@
+"""Binary (sign-bit) quantization of embeddings.
+
+Each dimension is reduced to one bit (value > 0) and packed 8 per byte, so a 768-dim
+float32 vector (3 KB) becomes 96 bytes and can be compared with Hamming distance.
+Used as a cheap first-stage scan; candidates are then rescored with the float vectors
+(dot_similarity / top_k, shared with the float ANN path).
+
+Stored and query embeddings are unit-normalized (normalize), so cosine similarity is a
+plain dot product and indexes use the "dot" metric.
+"""
+import numpy as np
+
+
+def normalize(vectors) -> np.ndarray:
+    """Scale a (n, dim) batch of vectors to unit length (zero vectors are left as is)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def binarize(vectors) -> np.ndarray:
+    """Pack the sign bits of a (n, dim) batch of vectors into (n, dim // 8) uint8 rows."""
+    return np.packbits(np.asarray(vectors, dtype=np.float32) > 0, axis=1)
+
+
+def dot_similarity(queries: np.ndarray, embeddings: np.ndarray, query_index: np.ndarray) -> np.ndarray:
+    """Similarity of each candidate row to the query it was retrieved for (cosine, for unit vectors).
+
+    All candidates are scored against all queries in one float32 matmul (SGEMM), then
+    each row keeps the column of its own query.
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    return (embeddings @ queries.T)[np.arange(len(embeddings)), query_index]
+
+
+def top_k(similarity: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest similarities, highest first (partial selection, then sorts only k)."""
+    if k < len(similarity):
+        top = np.argpartition(-similarity, k)[:k]
+    else:
+        top = np.arange(len(similarity))
+    return top[np.argsort(-similarity[top])]
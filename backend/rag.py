@@ -1,21 +1,25 @@
 import os
+import re
+import asyncio
+import hashlib
+import threading
+from contextvars import ContextVar
+import numpy as np
+from cachetools import LRUCache, TTLCache
 from pydantic_ai import Agent
-from backend.data_models import RagResponse
-from backend.constants import VECTOR_DATABASE_PATH, LLM_MODEL_NAME
-import lancedb
-
-# Connect to unified database
-# Lazy loading to prevent import-time errors
-vector_db = None
-
-def get_vector_db():
-    global vector_db
-    if vector_db is None:
-        vector_db = lancedb.connect(uri=VECTOR_DATABASE_PATH / "transcripts_unified")
-    return vector_db
+from backend.data_models import RagResponse, embedding_model, EMBEDDING_DIM_GEMINI, MD_ID_PATTERN
+from backend.constants import (
+    LLM_MODEL_NAME, SEARCH_BATCH_SIZE, SEARCH_BATCH_WAIT_MS, ANN_PROFILES, DEFAULT_ANN_PROFILE,
+    CONTEXT_CACHE_SIZE, CONTEXT_CACHE_TTL_SECONDS, CONTEXT_MAX_CHARS,
+)
+from backend.db import get_table, get_parent_index, get_indexed_columns
+from backend.quantization import normalize, binarize, dot_similarity, top_k
+from backend.batching import MicroBatcher
 
-# Store retrieval mode in a context variable (will be set by API)
-_retrieval_mode = "chunked"
+# Retrieval settings of the current request. ContextVars are scoped per asyncio task,
+# so concurrent agent runs (one per /query request) each see their own values.
+_retrieval_mode: ContextVar[str] = ContextVar("retrieval_mode", default="chunked")
+_ann_profile: ContextVar[str] = ContextVar("ann_profile", default=DEFAULT_ANN_PROFILE)
 
 rag_agent = Agent(
     model=LLM_MODEL_NAME,
@@ -34,68 +38,232 @@ rag_agent = Agent(
     output_type=RagResponse,
 )
 
+# Columns each retrieval source needs for building context blocks (skips the embedding vectors)
+SEARCH_COLUMNS = {
+    "parent_videos": ["md_id", "filename"],
+    "video_chunks": ["md_id", "chunk_id", "filename", "cleaned_content"],
+}
+# Large columns read only for the final top-k rows (by md_id), not for every rerank candidate:
+# a whole transcript can be hundreds of KB and refine_factor fetches up to 10x k candidates
+DEFERRED_COLUMNS = {
+    "parent_videos": ["content"],
+}
+
+
+# Query text -> embedding, so a query searched again (other mode/profile, cache expiry)
+# doesn't pay another Gemini embedding roundtrip
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+_query_embeddings = LRUCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+_query_embeddings_lock = threading.Lock()
+
+
+def embed_queries(queries: list[str]) -> list:
+    """Return unit-normalized query embeddings, computing only the ones not already cached (in one batched call)."""
+    with _query_embeddings_lock:
+        vectors = [_query_embeddings.get(q) for q in queries]
+    missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+    if missing:
+        computed = dict(zip(missing, normalize(embedding_model.compute_query_embeddings(missing))))
+        with _query_embeddings_lock:
+            _query_embeddings.update(computed)
+        vectors = [computed[q] if v is None else v for q, v in zip(queries, vectors)]
+    return vectors
+
+
+def warm_up_embeddings():
+    """Make one embedding call so the client handshake happens before the first user query."""
+    embedding_model.compute_query_embeddings(["warm-up"])
+
+
+def search_batch(items: list) -> list:
+    """Run a batch of (table_name, query, k, ann_profile) vector searches.
+
+    Requests sharing a table and ANN profile are embedded together and searched as a
+    single multi-vector LanceDB query; rows come back tagged with `query_index` and
+    are split per request.
+    """
+    results = [None] * len(items)
+    positions_by_group = {}
+    for i, (table_name, _, _, ann_profile) in enumerate(items):
+        positions_by_group.setdefault((table_name, ann_profile), []).append(i)
+
+    for (table_name, ann_profile), positions in positions_by_group.items():
+        table = get_table(table_name)
+        vectors = embed_queries([items[i][1] for i in positions])
+        k = max(items[i][2] for i in positions)
+        params = ANN_PROFILES[ann_profile]
+        indexed = get_indexed_columns(table_name)
+        if "embedding_bin" in indexed:
+            codes = list(binarize(vectors))
+            search = table.search(codes if len(codes) > 1 else codes[0], vector_column_name="embedding_bin") \
+                .distance_type("hamming")
+        else:
+            search = table.search(vectors if len(vectors) > 1 else vectors[0], vector_column_name="embedding") \
+                .distance_type("dot")
+
+        if not indexed & {"embedding", "embedding_bin"}:
+            # Flat scan: LanceDB already ranks exactly by dot product, so take its top k and
+            # its _distance as is (no over-fetch, no float vectors)
+            tbl = search.select(SEARCH_COLUMNS[table_name]).limit(k).to_arrow()
+            query_index = np.zeros(tbl.num_rows, dtype=np.int64)
+            if "query_index" in tbl.column_names:
+                query_index = tbl["query_index"].to_numpy()
+            distance = tbl["_distance"].to_numpy()
+            tbl = tbl.select(SEARCH_COLUMNS[table_name] + ["_distance"])
+            for n, i in enumerate(positions):
+                candidates = np.flatnonzero(query_index == n)
+                top = candidates[np.argsort(distance[candidates], kind="stable")[:items[i][2]]]
+                results[i] = tbl.take(top).to_pylist()
+        else:
+            # First stage: ANN scan for refine_factor x k candidates (Hamming over 1-bit codes when
+            # they are indexed); second stage: exact float32 dot-product (= cosine) rerank in-process
+            limit = k * max(1, params["refine_factor"])
+            # Stay in Arrow: only the rows each request keeps are converted to Python dicts
+            tbl = search.nprobes(params["nprobes"]).select(SEARCH_COLUMNS[table_name] + ["embedding"]) \
+                .limit(limit).to_arrow()
+            query_index = np.zeros(tbl.num_rows, dtype=np.int64)
+            if "query_index" in tbl.column_names:
+                query_index = tbl["query_index"].to_numpy()
+            embeddings = tbl["embedding"].combine_chunks().flatten().to_numpy() \
+                .reshape(tbl.num_rows, EMBEDDING_DIM_GEMINI)
+            similarity = dot_similarity(np.asarray(vectors), embeddings, query_index)
+            tbl = tbl.select(SEARCH_COLUMNS[table_name])
+
+            for n, i in enumerate(positions):
+                candidates = np.flatnonzero(query_index == n)
+                top = candidates[top_k(similarity[candidates], items[i][2])]
+                rows = tbl.take(top).to_pylist()
+                for row, distance in zip(rows, 1 - similarity[top]):
+                    row["_distance"] = float(distance)
+                results[i] = rows
+
+        if table_name in DEFERRED_COLUMNS:
+            fill_deferred_columns(table, DEFERRED_COLUMNS[table_name], [results[i] for i in positions])
+    return results
+
+
+MD_ID_RE = re.compile(MD_ID_PATTERN)
+
+
+def fill_deferred_columns(table, columns: list[str], groups: list[list[dict]]):
+    """Read `columns` for the rows in `groups` with one md_id lookup and merge them in place."""
+    # Only well-formed md_ids are interpolated into the predicate (same rule as the API's VideoId)
+    md_ids = list({row["md_id"] for rows in groups for row in rows if MD_ID_RE.fullmatch(row["md_id"] or "")})
+    if not md_ids:
+        return
+    md_id_list = ", ".join(f"'{md_id}'" for md_id in md_ids)
+    tbl = table.search().where(f"md_id IN ({md_id_list})", prefilter=True) \
+        .select(["md_id"] + columns).limit(len(md_ids)).to_arrow()
+    values = {row.pop("md_id"): row for row in tbl.to_pylist()}
+    for rows in groups:
+        for row in rows:
+            row.update(values.get(row["md_id"], {}))
+
+
+async def run_search_batch(items: list) -> list:
+    """Run a batch of searches, scanning each table concurrently in its own worker thread."""
+    positions_by_table = {}
+    for i, item in enumerate(items):
+        positions_by_table.setdefault(item[0], []).append(i)
+
+    async def search_table(positions: list) -> list:
+        # LanceDB/embedding calls are blocking, so keep them off the event loop
+        try:
+            return await asyncio.to_thread(search_batch, [items[i] for i in positions])
+        except Exception as e:
+            return [e] * len(positions)
+
+    results = [None] * len(items)
+    table_results = await asyncio.gather(*(search_table(p) for p in positions_by_table.values()))
+    for positions, table_result in zip(positions_by_table.values(), table_results):
+        for i, result in zip(positions, table_result):
+            results[i] = result
+    return results
+
+# Coalesces vector searches from concurrent agent runs into multi-vector queries
+search_batcher = MicroBatcher(run_search_batch, max_batch_size=SEARCH_BATCH_SIZE, max_wait_ms=SEARCH_BATCH_WAIT_MS)
+
+# Context block layouts, one per retrieval source
+WHOLE_RESULT_TEMPLATE = "[Result {idx}]\nFilename: {filename}\nContent: {content}"
+CHUNK_RESULT_TEMPLATE = "[Result {idx}]\nFilename: {filename} (Chunk {chunk_id})\nContent: {content}"
+CONTENT_SLICE = slice(CONTEXT_MAX_CHARS or None)
+
+# Formatted retrieval contexts: {(mode, ann_profile, k, query digest): context string}
+context_cache = TTLCache(maxsize=CONTEXT_CACHE_SIZE, ttl=CONTEXT_CACHE_TTL_SECONDS)
+
+
+def context_cache_key(retrieval_mode: str, ann_profile: str, k: int, query: str) -> tuple:
+    """Cache key for a retrieval call; case and whitespace differences map to the same entry."""
+    normalized = " ".join(query.lower().split())
+    return (retrieval_mode, ann_profile, k, hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest())
+
+
 @rag_agent.tool_plain
-def retrieve_top_documents(query: str, k=3) -> str:
+async def retrieve_top_documents(query: str, k=3) -> str:
     """
     Uses vector search to retrieve relevant documents.
     Retrieval mode determines source: 'chunked' uses granular chunks, 'whole' uses full documents.
     Returns top-k contexts to reduce hallucination risk.
     """
-    global _retrieval_mode
-    
-    db = get_vector_db()
-    if _retrieval_mode == "whole":
-        results = db["parent_videos"].search(query=query).limit(k).to_list()
+    retrieval_mode, ann_profile = _retrieval_mode.get(), _ann_profile.get()
+    key = context_cache_key(retrieval_mode, ann_profile, k, query)
+    context = context_cache.get(key)
+    if context is None:
+        context = context_cache[key] = await build_context(retrieval_mode, ann_profile, query, k)
+    return context
+
+
+async def build_context(retrieval_mode: str, ann_profile: str, query: str, k: int) -> str:
+    """Search the source for `retrieval_mode` and format the hits as [Result N] blocks."""
+    if retrieval_mode == "whole":
+        results = await search_batcher.submit(("parent_videos", query, k, ann_profile))
         if not results:
             return "No relevant documents found."
-        blocks = []
-        for idx, r in enumerate(results, 1):
-            filename = r.get("filename", "Unknown")
-            content = r.get("content", "")
-            blocks.append(
-                f"[Result {idx}]\nFilename: {filename}\nContent: {content}"
+        return "\n\n".join(
+            WHOLE_RESULT_TEMPLATE.format(
+                idx=idx,
+                filename=r.get("filename", "Unknown"),
+                content=(r.get("content") or "")[CONTENT_SLICE],
             )
-        return "\n\n".join(blocks)
+            for idx, r in enumerate(results, 1)
+        )
     else:  # chunked mode (default)
-        results = db["video_chunks"].search(query=query).limit(k).to_list()
+        results = await search_batcher.submit(("video_chunks", query, k, ann_profile))
         if not results:
             return "No relevant documents found."
 
-        # Resolve md_id -> filename from parent table so chunk citations are stable
-        # even when the chunk table does not store filename.
-        md_ids = []
-        for r in results:
-            md_id = r.get("md_id")
-            if md_id and md_id not in md_ids:
-                md_ids.append(md_id)
+        # Chunks carry their video's filename; rows ingested before it was denormalized
+        # fall back to the in-memory md_id -> metadata map of parent_videos.
+        md_ids = {r.get("md_id") for r in results if not r.get("filename")}
+        md_ids.discard(None)
 
         filename_by_md_id = {}
         if md_ids:
             try:
-                parent_table = db["parent_videos"]
-                where_expr = " OR ".join([f"md_id = '{mid}'" for mid in md_ids])
-                parent_rows = parent_table.search().where(where_expr).limit(len(md_ids)).to_list()
+                parent_index = await asyncio.to_thread(get_parent_index)
                 filename_by_md_id = {
-                    pr.get("md_id"): pr.get("filename", "Unknown")
-                    for pr in parent_rows
-                    if pr.get("md_id")
+                    mid: parent_index[mid].get("filename", "Unknown")
+                    for mid in md_ids
+                    if mid in parent_index
                 }
             except Exception:
                 # Best-effort: if anything goes wrong, fall back to 'Unknown'.
                 filename_by_md_id = {}
 
-        blocks = []
-        for idx, r in enumerate(results, 1):
-            md_id = r.get("md_id")
-            filename = filename_by_md_id.get(md_id) or r.get("filename", "Unknown")
-            chunk_id = r.get("chunk_id", "Unknown")
-            content = r.get("cleaned_content", "")
-            blocks.append(
-                f"[Result {idx}]\nFilename: {filename} (Chunk {chunk_id})\nContent: {content}"
+        return "\n\n".join(
+            CHUNK_RESULT_TEMPLATE.format(
+                idx=idx,
+                filename=r.get("filename") or filename_by_md_id.get(r.get("md_id"), "Unknown"),
+                chunk_id=r.get("chunk_id", "Unknown"),
+                content=(r.get("cleaned_content") or "")[CONTENT_SLICE],
             )
-        return "\n\n".join(blocks)
+            for idx, r in enumerate(results, 1)
+        )
 
 def set_retrieval_mode(mode: str):
-    """Set the retrieval mode for the RAG agent."""
-    global _retrieval_mode
-    _retrieval_mode = mode
\ No newline at end of file
+    """Set the retrieval mode for agent runs in the current request context."""
+    _retrieval_mode.set(mode)
+
+def set_ann_profile(profile: str):
+    """Set the ANN search profile (see ANN_PROFILES) for agent runs in the current request context."""
+    _ann_profile.set(profile)
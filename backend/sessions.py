@@ -0,0 +1,98 @@
+"""Session storage for the legacy /session endpoints.
+
+When REDIS_URL is set, sessions live in Redis so every worker/instance sees the same
+sessions and Redis TTLs handle expiry. Otherwise they fall back to a per-process TTL cache.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+
+from cachetools import TTLCache
+
+from backend.constants import HISTORY_MAX_MESSAGES, REDIS_URL
+
+SESSION_TTL_MINUTES = 60  # Expire sessions older than 1 hour
+MAX_SESSIONS = 10_000  # Cap for the in-process fallback
+SESSION_KEY_PREFIX = "sess:"
+
+
+@dataclass(slots=True)
+class Session:
+    """In-process session state (slots keep per-session overhead below a dict's)."""
+    # Bounded history: oldest messages drop off in O(1) once the window is full
+    history: deque = field(default_factory=lambda: deque(maxlen=HISTORY_MAX_MESSAGES))
+    created_at: float = field(default_factory=time.time)
+
+
+# In-process fallback: {session_id: Session}
+sessions = TTLCache(maxsize=MAX_SESSIONS, ttl=SESSION_TTL_MINUTES * 60)
+sessions_lock = threading.Lock()
+
+# Lazy loading: redis is only imported when REDIS_URL is configured
+_redis = None
+
+
+def get_redis():
+    """Return the shared async Redis client, or None when REDIS_URL is not set."""
+    global _redis
+    if _redis is None and REDIS_URL:
+        import redis.asyncio as redis
+        _redis = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
+
+
+async def create_session() -> str:
+    """Create a new session ID for tracking conversation history"""
+    session_id = str(uuid.uuid4())
+    client = get_redis()
+    if client is not None:
+        await client.setex(SESSION_KEY_PREFIX + session_id, SESSION_TTL_MINUTES * 60, json.dumps({"history": []}))
+        return session_id
+
+    with sessions_lock:
+        sessions[session_id] = Session()
+    return session_id
+
+
+async def list_session_ids() -> list[str]:
+    """Return all active (non-expired) session IDs."""
+    client = get_redis()
+    if client is not None:
+        return [key[len(SESSION_KEY_PREFIX):] async for key in client.scan_iter(match=SESSION_KEY_PREFIX + "*")]
+
+    with sessions_lock:
+        return list(sessions.keys())
+
+
+async def delete_session(session_id: str) -> bool:
+    """Delete a session; returns False if it did not exist."""
+    client = get_redis()
+    if client is not None:
+        return await client.delete(SESSION_KEY_PREFIX + session_id) > 0
+
+    with sessions_lock:
+        return sessions.pop(session_id, None) is not None
+
+
+async def expire_sessions_periodically(interval_seconds: float = SESSION_TTL_MINUTES * 60 / 4):
+    """Background loop that drops expired in-process sessions while the API is idle.
+
+    TTLCache only expires entries lazily when it is touched, so without this an
+    idle worker would keep stale histories in memory. Redis expires keys itself.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        with sessions_lock:
+            sessions.expire()
+
+
+async def close():
+    """Close the Redis connection pool (no-op for the in-process store)."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
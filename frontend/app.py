@@ -1,10 +1,15 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-import requests
-from config import build_api_url, get_api_base_url
+from config import build_api_url, get_api_base_url, api_session, API_TIMEOUT
 from rag_bot import RAGBot
 
 API_BASE_URL = get_api_base_url()
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+logger = logging.getLogger(__name__)
+
 
 def init_session_states():
     if "messages" not in st.session_state:
@@ -20,18 +25,18 @@ def fetch_videos():
     """Fetch all available videos from the API"""
     try:
         url = build_api_url("videos")
-        print(f"Fetching videos from: {url}")  # Debug
-        response = requests.get(url)
-        print(f"Response status: {response.status_code}")  # Debug
+        logger.debug("Fetching videos from: %s", url)
+        response = api_session.get(url, timeout=API_TIMEOUT)
+        logger.debug("Response status: %s", response.status_code)
         if response.status_code == 200:
             data = response.json()
-            print(f"Found {len(data['videos'])} videos")  # Debug
+            logger.debug("Found %d videos", len(data["videos"]))
             return {v["filename"]: v["md_id"] for v in data["videos"]}
         else:
-            print(f"Error response: {response.text}")  # Debug
+            logger.warning("Error response: %s", response.text)
         return {}
     except Exception as e:
-        print(f"Exception fetching videos: {e}")  # Debug
+        logger.warning("Exception fetching videos: %s", e)
         st.error(f"Failed to fetch videos: {e}")
         return {}
 
@@ -43,15 +48,20 @@ def fetch_video_metadata(video_id):
     keywords = ""
     
     try:
+        # Description and keywords are independent, so fetch them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            desc_future = executor.submit(api_session.get, build_api_url(f"video/description/{video_id}"), timeout=API_TIMEOUT)
+            kw_future = executor.submit(api_session.get, build_api_url(f"video/keywords/{video_id}"), timeout=API_TIMEOUT)
+            desc_response = desc_future.result()
+            kw_response = kw_future.result()
+
         # Description
-        desc_response = requests.get(build_api_url(f"video/description/{video_id}"))
         if desc_response.status_code == 200:
             desc_data = desc_response.json()
             # Handle potential key variations (summary vs description)
             desc = desc_data.get("summary") or desc_data.get("description", "No description available")
             
         # Keywords
-        kw_response = requests.get(build_api_url(f"video/keywords/{video_id}"))
         if kw_response.status_code == 200:
             kw_data = kw_response.json()
             keywords = kw_data.get("keywords", "")
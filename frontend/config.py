@@ -1,12 +1,32 @@
 import os
+from functools import lru_cache
 from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 import posixpath
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DEFAULT_API_BASE_URL = "http://127.0.0.1:7071/"
 
+# (connect, read) timeout in seconds for API calls, so a stalled API cannot block the script run
+API_TIMEOUT = (3, 30)
+
+# One pooled keep-alive session for all API calls (reuses TCP/TLS connections across reruns).
+# Transient 429/5xx responses are retried with backoff; urllib3 only retries idempotent
+# methods by default, so a /query POST is never sent twice.
+api_session = requests.Session()
+api_session.headers["Connection"] = "keep-alive"
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+)
+api_session.mount("http://", _adapter)
+api_session.mount("https://", _adapter)
+
 
 def _append_host_key_if_needed(base_url: str) -> str:
     host_key = os.getenv("HOST_KEY")
@@ -23,8 +43,12 @@ def _append_host_key_if_needed(base_url: str) -> str:
     return urlunsplit((parts.scheme, parts.netloc, parts.path, new_query, parts.fragment))
 
 
+@lru_cache(maxsize=1)
 def get_api_base_url() -> str:
-    """Resolve API base URL from Streamlit secrets, env vars, or default, then append HOST_KEY if present and not already in the URL."""
+    """Resolve API base URL from Streamlit secrets, env vars, or default, then append HOST_KEY if present and not already in the URL.
+
+    Resolved once per process; call get_api_base_url.cache_clear() after changing the settings.
+    """
     secret_url = None
     try:
         import streamlit as st
@@ -38,10 +62,14 @@ def get_api_base_url() -> str:
     return _append_host_key_if_needed(raw_url)
 
 
+@lru_cache(maxsize=1)
+def _api_base_parts(base_url: str):
+    return urlsplit(base_url)
+
+
 def build_api_url(path: str) -> str:
     """Join base URL with path while preserving existing query params (e.g., ?code=host_key)."""
-    base = get_api_base_url()
-    parts = urlsplit(base)
+    parts = _api_base_parts(get_api_base_url())
     # normalize path join on POSIX style
     new_path = posixpath.join(parts.path, path.lstrip("/"))
     return urlunsplit((parts.scheme, parts.netloc, new_path, parts.query, parts.fragment))
@@ -1,6 +1,6 @@
 from typing import List
 import requests
-from config import get_api_base_url, build_api_url
+from config import get_api_base_url, build_api_url, api_session, API_TIMEOUT
 
 
 class RAGBot:
@@ -19,7 +19,7 @@ class RAGBot:
         }
         
         try:
-            response = requests.post(build_api_url("query"), json=payload, timeout=30)
+            response = api_session.post(build_api_url("query"), json=payload, timeout=API_TIMEOUT)
             
             if response.status_code != 200:
                 return {
@@ -1,10 +1,22 @@
+import asyncio
 import azure.functions as func
 import api
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
 
+# Reuse one ASGI bridge per worker so the FastAPI lifespan (LanceDB warm-up) runs once
+asgi_middleware = func.AsgiMiddleware(api.app)
+_startup_lock = asyncio.Lock()
+_started = False
+
 @app.route(route="{*route}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def fastapi_proxy(
     req: func.HttpRequest, context: func.Context
 ) -> func.HttpResponse:
-    return await func.AsgiMiddleware(api.app).handle_async(req, context)
\ No newline at end of file
+    global _started
+    if not _started:
+        async with _startup_lock:
+            if not _started:
+                await asgi_middleware.notify_startup()
+                _started = True
+    return await asgi_middleware.handle_async(req, context)
@@ -20,24 +20,34 @@ warnings.filterwarnings("ignore", category=FutureWarning, module="google.generat
 os.environ["GRPC_VERBOSITY"] = "ERROR"
 
 import asyncio
+import functools
 import hashlib
 import json
 import time
+import math
+import re
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import shutil
 
 import lancedb
+import numpy as np
+import orjson
+import pyarrow as pa
 from pydantic_ai import Agent
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import tiktoken
 
-from backend.constants import VECTOR_DATABASE_PATH, LLM_MODEL_NAME
+from backend.constants import VECTOR_DATABASE_PATH, LLM_MODEL_NAME, EMBEDDING_DIM_GEMINI
 from backend.data_models import (
     TranscriptGeminiWhole,
     TranscriptGeminiChunk,
     VideoMetadata,
+    embedding_model,
+    EMBEDDING_BIN_BYTES,
 )
+from backend.keyword_stats import build_keyword_stats
+from backend.quantization import normalize, binarize
 
 
 # ============================================================================
@@ -52,8 +62,17 @@ CHECKPOINT_FILE = Path(__file__).parent / "ingestion_checkpoint.json"
 CHUNK_SIZE = 400  # tokens (target 300-400)
 CHUNK_OVERLAP = 100  # tokens (25% overlap)
 
-# Rate limiting
-SLEEP_AFTER_LLM_CALL = 10  # seconds (conservative to avoid 429s)
+# Rate limiting: metadata LLM calls are spaced to at most this many per minute across all
+# concurrent files (conservative to avoid 429s), instead of a fixed sleep after each call
+LLM_CALLS_PER_MINUTE = float(os.getenv("LLM_CALLS_PER_MINUTE", "10"))
+# Batched embedding requests (one per file) per minute
+EMBEDDING_CALLS_PER_MINUTE = float(os.getenv("EMBEDDING_CALLS_PER_MINUTE", "150"))
+
+# Files processed concurrently, so one file's embedding/read overlaps another's LLM call
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))
+
+# Processed files are upserted together, one merge per table every WRITE_BATCH_FILES files
+WRITE_BATCH_FILES = 32
 
 
 # ============================================================================
@@ -75,19 +94,23 @@ def load_checkpoint() -> Dict:
 
 
 def save_checkpoint(checkpoint: Dict):
-    """Save processing checkpoint to disk."""
+    """Save processing checkpoint to disk.
+
+    Written to a temp file and swapped in with os.replace, so an interrupted run never
+    leaves a truncated checkpoint behind.
+    """
     from datetime import datetime
     checkpoint["last_updated"] = datetime.now().isoformat()
-    with open(CHECKPOINT_FILE, "w", encoding="utf-8") as f:
-        json.dump(checkpoint, f, indent=2)
+    tmp_file = CHECKPOINT_FILE.with_suffix(".tmp")
+    tmp_file.write_bytes(orjson.dumps(checkpoint, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_file, CHECKPOINT_FILE)
 
 
 def mark_file_processed(checkpoint: Dict, filename: str):
-    """Mark a file as successfully processed."""
+    """Mark a file as successfully processed (in memory; the caller saves the checkpoint)."""
     from datetime import datetime
     checkpoint["processed_files"][filename] = datetime.now().isoformat()
     checkpoint["total_processed"] = len(checkpoint["processed_files"])
-    save_checkpoint(checkpoint)
 
 
 # ============================================================================
@@ -101,12 +124,76 @@ def generate_md_id(filename: str) -> str:
     return hashlib.md5(name_without_ext.encode()).hexdigest()
 
 
+def hash_content(content: str) -> str:
+    """Fingerprint of the transcript text, stored as parent_videos.content_hash."""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hash_file(file: Path) -> str:
+    return hash_content(file.read_text(encoding="utf-8", errors="replace"))
+
+
+def load_content_hashes(db: lancedb.LanceDBConnection) -> Dict[str, str]:
+    """md_id -> content_hash of the stored videos (rows ingested before the column have none)."""
+    rows = db["parent_videos"].search().select(["md_id", "content_hash"]).limit(None).to_arrow().to_pylist()
+    return {row["md_id"]: row["content_hash"] for row in rows if row["content_hash"]}
+
+
 # ============================================================================
 # LLM METADATA GENERATION
 # ============================================================================
 
+class RateLimiter:
+    """Space out call starts to at most `calls_per_minute`, shared by concurrent tasks.
+
+    Adaptive: each rate-limit error (throttle) halves the rate, down to 1/8 of the
+    configured one; every RECOVER_AFTER successes in a row (succeeded) double it back.
+    """
+    MAX_SLOWDOWN = 8
+    RECOVER_AFTER = 10
+
+    def __init__(self, calls_per_minute: float):
+        self.base_interval = 60 / calls_per_minute
+        self.slowdown = 1
+        self._successes = 0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Wait until this caller's slot comes up."""
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.base_interval * self.slowdown
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def throttle(self):
+        """Record a rate-limit error: halve the rate."""
+        self.slowdown = min(self.slowdown * 2, self.MAX_SLOWDOWN)
+        self._successes = 0
+
+    def succeeded(self):
+        """Record a successful call: after enough in a row, double the rate back."""
+        self._successes += 1
+        if self.slowdown > 1 and self._successes >= self.RECOVER_AFTER:
+            self.slowdown //= 2
+            self._successes = 0
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    """Whether an API error is a quota / rate-limit rejection (HTTP 429)."""
+    message = str(e).lower()
+    return "429" in message or "quota" in message or "resource_exhausted" in message
+
+
+llm_rate_limiter = RateLimiter(LLM_CALLS_PER_MINUTE)
+embedding_rate_limiter = RateLimiter(EMBEDDING_CALLS_PER_MINUTE)
+
+
+@functools.cache
 def create_metadata_agent() -> Agent:
-    """Create PydanticAI agent for generating summary + keywords."""
+    """Create PydanticAI agent for generating summary + keywords (once per run; reused for every file)."""
     agent = Agent(
         model=LLM_MODEL_NAME,
         retries=3,  # Retry on failures
@@ -133,10 +220,13 @@ Transcript:
 
     while True:  # Keep trying until success
         try:
+            await llm_rate_limiter.wait()
             result = await agent.run(prompt)
+            llm_rate_limiter.succeeded()
             return result.output
         except Exception as e:
-            if "429" in str(e) or "quota" in str(e).lower() or "resource_exhausted" in str(e).lower():
+            if is_rate_limit_error(e):
+                llm_rate_limiter.throttle()
                 # If we hit 20/day (or other limit), we might need to wait.
                 # Let's try waiting 120 seconds and trying again.
                 print(f"  ⚠️  Quota hit (429). Waiting 120s to retry...")
@@ -146,22 +236,47 @@ Transcript:
                 raise e
 
 
+# Speech fillers removed from the LLM-facing chunk text
+FILLER_RE = re.compile(r"\b(uh|um|basically|like|you know|i mean)\b", re.IGNORECASE)
+SPACES_RE = re.compile(r"[ \t]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
 def heavy_clean_text(text: str) -> str:
     """Aggressive cleanup for LLM consumption (remove fillers, collapse whitespace)."""
-    import re
-
-    fillers = ["uh", "um", "basically", "like", "you know", "i mean"]
-    pattern = re.compile(r"\b(" + "|".join(fillers) + r")\b", re.IGNORECASE)
-    text = pattern.sub(" ", text)
+    text = FILLER_RE.sub(" ", text)
     # Collapse repeated spaces/newlines while preserving paragraph breaks
-    text = re.sub(r"[ \t]+", " ", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = SPACES_RE.sub(" ", text)
+    text = BLANK_LINES_RE.sub("\n\n", text)
     return text.strip()
 
 
-async def embed_with_retry(text_or_texts, max_retries: int = 3, base_sleep: float = 1.0):
-    """Deprecated: embeddings are generated by LanceDB on insert. Kept for future use."""
-    return None
+async def embed_with_retry(texts: List[str], max_retries: int = 3, base_sleep: float = 1.0) -> List[List[float]]:
+    """Embed documents with batched Gemini requests (up to 100 texts per API call).
+
+    LanceDB's embedding hook calls the API once per row; passing the vectors in
+    with the rows skips it. Task type and title match what the hook would use.
+    """
+    for attempt in range(max_retries):
+        try:
+            await embedding_rate_limiter.wait()
+            result = await asyncio.to_thread(
+                embedding_model.client.embed_content,
+                model=embedding_model.name,
+                content=texts,
+                task_type=embedding_model.source_task_type,
+                title="Embedding of a document",
+            )
+            embedding_rate_limiter.succeeded()
+            return result["embedding"]
+        except Exception as e:
+            if is_rate_limit_error(e):
+                embedding_rate_limiter.throttle()
+            if attempt == max_retries - 1:
+                raise
+            sleep_for = base_sleep * (2 ** attempt)
+            print(f"  ⚠️ Embedding failed ({e}), retrying in {sleep_for:.0f}s...")
+            await asyncio.sleep(sleep_for)
 
 
 def normalize_keywords(raw: str) -> str:
@@ -183,18 +298,21 @@ def normalize_keywords(raw: str) -> str:
 # CHUNKING
 # ============================================================================
 
-async def chunk_content(content: str, md_id: str) -> List[TranscriptGeminiChunk]:
+# Built once per run: tiktoken loads its BPE ranks on first use
+TOKEN_ENCODING = tiktoken.get_encoding("cl100k_base")  # GPT-4 tokenizer
+SPLITTER = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    encoding_name="cl100k_base",
+)
+
+
+async def chunk_content(content: str, md_id: str, filename: str) -> List[TranscriptGeminiChunk]:
     """Chunk content using token-based splitting and build LanceModel records."""
-    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        encoding_name="cl100k_base",  # GPT-4 tokenizer
-    )
-    
-    chunks = splitter.split_text(content)
+    chunks = SPLITTER.split_text(content)
 
-    enc = tiktoken.get_encoding("cl100k_base")
-    chunk_tokens = [len(enc.encode(c)) for c in chunks]
+    # One call for all chunks; tiktoken encodes the batch on parallel native threads
+    chunk_tokens = [len(tokens) for tokens in TOKEN_ENCODING.encode_batch(chunks, num_threads=os.cpu_count() or 1)]
 
     chunk_records: List[TranscriptGeminiChunk] = []
     for idx, chunk_text in enumerate(chunks):
@@ -202,6 +320,7 @@ async def chunk_content(content: str, md_id: str) -> List[TranscriptGeminiChunk]
             TranscriptGeminiChunk(
                 md_id=md_id,
                 chunk_id=idx,
+                filename=filename,
                 raw_content=chunk_text,
                 cleaned_content=heavy_clean_text(chunk_text),
                 token_count=chunk_tokens[idx],
@@ -230,54 +349,180 @@ def setup_vector_db(path: Path):
     db = lancedb.connect(uri=path)
     
     # Create tables if they don't exist
-    if "parent_videos" not in db.list_tables():
+    existing_tables = db.list_tables().tables
+    if "parent_videos" not in existing_tables:
         db.create_table("parent_videos", schema=TranscriptGeminiWhole, exist_ok=True)
         print("✅ Created parent_videos table")
     
-    if "video_chunks" not in db.list_tables():
+    if "video_chunks" not in existing_tables:
         db.create_table("video_chunks", schema=TranscriptGeminiChunk, exist_ok=True)
         print("✅ Created video_chunks table")
+
+    # Tables created by older versions: add columns introduced since (embedding_bin, content_hash,
+    # video_chunks.filename) as empty nullable columns; re-ingestion fills them
+    for table_name, model in (("parent_videos", TranscriptGeminiWhole), ("video_chunks", TranscriptGeminiChunk)):
+        table = db[table_name]
+        for field in model.to_arrow_schema():
+            if field.name not in table.schema.names:
+                table.add_columns(field)
+                print(f"✅ Added {field.name} column to {table_name}")
     
     return db
 
 
+def compact_tables(db: lancedb.LanceDBConnection):
+    """Merge the small fragments left by batched upserts into larger ones.
+
+    Old versions are pruned with LanceDB's default retention, so a running API that
+    still reads an earlier version keeps working until it refreshes.
+    """
+    for table_name in ("parent_videos", "video_chunks"):
+        db[table_name].optimize()
+        print(f"✅ Compacted {table_name}")
+
+
+def create_scalar_indexes(db: lancedb.LanceDBConnection):
+    """(Re)build scalar indexes used for point lookups by the API."""
+    # BTREE on md_id turns /video/{description,keywords}/{id} into an indexed lookup
+    db["parent_videos"].create_scalar_index("md_id", index_type="BTREE", replace=True)
+    print("✅ Indexed parent_videos.md_id")
+    # query_metadata looks videos up by filename
+    db["parent_videos"].create_scalar_index("filename", index_type="BTREE", replace=True)
+    print("✅ Indexed parent_videos.filename")
+
+    # Same key on the chunks lets per-video filters (where md_id = ...) prune before the vector search
+    chunk_table = db["video_chunks"]
+    if chunk_table.count_rows() > 0:
+        chunk_table.create_scalar_index("md_id", index_type="BTREE", replace=True)
+        print("✅ Indexed video_chunks.md_id")
+
+
+# Below this many rows a brute-force (flat) scan is exact and cheaper than IVF probing +
+# dequantization, so the table is left without a vector index (IVF also needs rows to train).
+# That includes the Hamming index on embedding_bin: at this size there is no binary prefilter,
+# so ingestion doesn't store the codes either (they are derived when a BINARY index is built).
+MIN_ROWS_FOR_VECTOR_INDEX = int(os.getenv("MIN_ROWS_FOR_VECTOR_INDEX", "50000"))
+PQ_NUM_SUB_VECTORS = 96  # 768 / 96 = 8 dims per sub-quantizer
+# First-stage index, exactly one per table (search uses whichever is built):
+# IVF_PQ: ~96 bytes/vector in the index; IVF_SQ: int8 scalar quantization (768 bytes/vector,
+# higher recall); BINARY: 1-bit codes in embedding_bin scanned by Hamming distance (96 bytes/vector).
+# Either way the float32 column stays for refine_factor re-ranking.
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "IVF_SQ")
+
+
+def backfill_binary_codes(table, key_columns: List[str]):
+    """Fill missing embedding_bin codes from the stored float embeddings (no re-embedding)."""
+    missing = table.search().where("embedding_bin IS NULL").limit(None).to_arrow()
+    if missing.num_rows == 0:
+        return
+    embeddings = missing["embedding"].combine_chunks().flatten().to_numpy() \
+        .reshape(missing.num_rows, EMBEDDING_DIM_GEMINI)
+    field = table.schema.field("embedding_bin")
+    codes = pa.FixedSizeListArray.from_arrays(pa.array(binarize(embeddings).ravel()), EMBEDDING_BIN_BYTES)
+    missing = missing.set_column(missing.schema.get_field_index("embedding_bin"), field, codes.cast(field.type))
+    table.merge_insert(on=key_columns).when_matched_update_all().execute(missing)
+    print(f"✅ Derived binary codes for {missing.num_rows} rows")
+
+
+def drop_vector_indexes(table, columns: set):
+    """Drop the vector indexes on any of `columns`."""
+    for index in table.list_indices():
+        if set(index.columns) & columns:
+            table.drop_index(index.name)
+
+
+def create_vector_indexes(db: lancedb.LanceDBConnection):
+    """(Re)build the first-stage index (VECTOR_INDEX_TYPE) on the embedding columns."""
+    for table_name, key_columns in (("parent_videos", ["md_id"]), ("video_chunks", ["md_id", "chunk_id"])):
+        table = db[table_name]
+        row_count = table.count_rows()
+        if row_count < MIN_ROWS_FOR_VECTOR_INDEX:
+            # Drop indexes left from a lower threshold (float and Hamming) so queries take
+            # the exact flat path
+            drop_vector_indexes(table, {"embedding", "embedding_bin"})
+            print(f"⏭️  Flat search on {table_name} ({row_count} rows < {MIN_ROWS_FOR_VECTOR_INDEX}), no vector index")
+            continue
+
+        # ~sqrt(N) partitions keeps both the centroid scan and per-partition lists small
+        num_partitions = max(1, int(math.sqrt(row_count)))
+
+        if VECTOR_INDEX_TYPE == "BINARY":
+            # Binary codes: exact Hamming within the probed partitions, rescored with float32 at
+            # query time. Every row needs a code first (rows without one would never be found)
+            drop_vector_indexes(table, {"embedding"})
+            backfill_binary_codes(table, key_columns)
+            table.create_index(
+                vector_column_name="embedding_bin",
+                index_type="IVF_FLAT",
+                metric="hamming",
+                num_partitions=num_partitions,
+                replace=True,
+            )
+            print(f"✅ IVF_FLAT (hamming) index on {table_name}.embedding_bin ({num_partitions} partitions)")
+            continue
+
+        # Search prefers a Hamming index when one exists, so drop it when switching back
+        drop_vector_indexes(table, {"embedding_bin"})
+        options = {"num_sub_vectors": PQ_NUM_SUB_VECTORS} if VECTOR_INDEX_TYPE == "IVF_PQ" else {}
+        table.create_index(
+            vector_column_name="embedding",
+            index_type=VECTOR_INDEX_TYPE,
+            metric="dot",
+            num_partitions=num_partitions,
+            replace=True,
+            **options,
+        )
+        print(f"✅ {VECTOR_INDEX_TYPE} index on {table_name}.embedding ({num_partitions} partitions)")
+
+
+@functools.cache
+def arrow_schema(model: type) -> pa.Schema:
+    return model.to_arrow_schema()
+
+
+def build_arrow_table(model: type, records: List, embeddings: np.ndarray) -> pa.Table:
+    """Columnar Arrow table of records plus their embeddings, in the table's schema.
+
+    Scalar columns are read straight off the models (no per-row model_dump dicts); the
+    vectors are wrapped from the flat numpy buffer instead of per-float Python lists.
+    embedding_bin is left null (see backfill_binary_codes).
+    """
+    schema = arrow_schema(model)
+    columns = {
+        name: [getattr(record, name) for record in records]
+        for name in schema.names if name not in ("embedding", "embedding_bin")
+    }
+    columns["embedding"] = pa.FixedSizeListArray.from_arrays(
+        pa.array(np.ascontiguousarray(embeddings, dtype=np.float32).ravel()), EMBEDDING_DIM_GEMINI
+    )
+    columns["embedding_bin"] = pa.nulls(len(records), type=schema.field("embedding_bin").type)
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
 # ============================================================================
 # MAIN INGESTION PIPELINE
 # ============================================================================
 
-async def process_single_file(
-    file: Path,
-    db: lancedb.LanceDBConnection,
-    checkpoint: Dict
-) -> bool:
-    """Process a single markdown file through the full pipeline.
+async def process_single_file(file: Path, checkpoint: Dict) -> Optional[Tuple[pa.Table, pa.Table]]:
+    """Process a single markdown file up to the rows to store (written later in batches).
     
     Steps:
         1. Load content
         2. Generate metadata (summary + keywords) via LLM
         3. Create whole document record
-        4. Store in parent_videos table
-        5. Chunk content
-        6. Create chunk records
-        7. Store in video_chunks table
+        4. Chunk content
+        5. Embed document + chunks (batched)
+        6. Build the parent_videos row and video_chunks rows (as Arrow tables)
     
     Returns:
-        True if successful, False otherwise
+        (parent_table, chunk_table), or None if processing failed
     """
     filename = file.name
     
-    # Skip if already processed
-    if filename in checkpoint["processed_files"]:
-        print(f"⏭️  Skipping {filename} (already processed)")
-        return True
-    
     try:
-        print(f"📄 Processing: {filename}")
-        
-        # STEP 1: Load content
+        # STEP 1: Load content (off the event loop, so other files' API calls keep going)
         # FIX: Robust file reading (prevents crash on encoding errors)
-        with open(file, "r", encoding="utf-8", errors="replace") as f:
-            content = f.read()
+        content = await asyncio.to_thread(file.read_text, encoding="utf-8", errors="replace")
         print(f"  ✓ Loaded {len(content)} characters")
         
         # STEP 2: Generate deterministic ID
@@ -293,65 +538,97 @@ async def process_single_file(
         print(f"  ✓ Summary: {metadata.summary[:60]}...")
         print(f"  ✓ Keywords: {len(keywords_clean.split(','))} tags")
         
-        # Rate limiting (non-blocking)
-        await asyncio.sleep(SLEEP_AFTER_LLM_CALL)
-        
-        # STEP 4: Create whole document record (embedding is auto-generated by LanceDB)
+        # STEP 4: Create whole document record (embedding is added below, batched with the chunks)
         parent_record = TranscriptGeminiWhole(
             md_id=md_id,
             filepath=str(file.absolute()),
             filename=filename_without_ext,
             content=content,
+            content_hash=hash_content(content),
             summary=metadata.summary,
             keywords=keywords_clean,
         )
         
-        # STEP 5: Upsert into parent_videos table
-        # FIX: Atomic Upsert (Prevents data loss if script fails mid-operation)
-        parent_table = db["parent_videos"]
-        parent_row = parent_record.model_dump(exclude={"embedding"}, exclude_none=True)
-        parent_table.merge_insert(on="md_id") \
-                    .when_matched_update_all() \
-                    .when_not_matched_insert_all() \
-                    .execute([parent_row])
-        print(f"  ✓ Upserted parent record")
-        
-        # STEP 6: Chunk content
-        chunks = await chunk_content(content, md_id)
+        # STEP 5: Chunk content
+        chunks = await chunk_content(content, md_id, filename_without_ext)
         print(f"  ✓ Created {len(chunks)} chunks")
         
-        # STEP 7: Upsert chunks in video_chunks table using (md_id, chunk_id) as key
-        # FIX: Atomic Chunk Upsert
-        chunk_table = db["video_chunks"]
-        chunk_rows = [c.model_dump(exclude={"embedding"}, exclude_none=True) for c in chunks]
-        chunk_table.merge_insert(on=["md_id", "chunk_id"]) \
-                   .when_matched_update_all() \
-                   .when_not_matched_insert_all() \
-                   .execute(chunk_rows)
-        print(f"  ✓ Upserted {len(chunks)} chunks")
+        # STEP 6: Embed the document and all its chunks in batched requests
+        # Unit length: the "dot" index metric equals cosine
+        embeddings = normalize(await embed_with_retry([content] + [c.raw_content for c in chunks]))
+        print(f"  ✓ Embedded {len(embeddings)} texts")
         
-        # Mark as processed
-        mark_file_processed(checkpoint, filename)
-        print(f"  ✅ Completed: {filename}")
-        
-        return True
+        # STEP 7: Rows for parent_videos (keyed on md_id) and video_chunks (keyed on md_id, chunk_id)
+        parent_table = build_arrow_table(TranscriptGeminiWhole, [parent_record], embeddings[:1])
+        chunk_table = build_arrow_table(TranscriptGeminiChunk, chunks, embeddings[1:])
+        return parent_table, chunk_table
         
     except Exception as e:
         print(f"  ❌ Error processing {filename}: {e}")
-        checkpoint["last_error"] = {
-            "file": filename,
-            "error": str(e),
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        save_checkpoint(checkpoint)
+        record_error(checkpoint, filename, e)
+        return None
+
+
+def record_error(checkpoint: Dict, filename: str, error: Exception):
+    """Store the last ingestion error in the checkpoint."""
+    checkpoint["last_error"] = {
+        "file": filename,
+        "error": str(error),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    save_checkpoint(checkpoint)
+
+
+def upsert_rows(db: lancedb.LanceDBConnection, batch: List[Tuple[str, pa.Table, pa.Table]]):
+    """Upsert the rows of several processed files with one merge per table.
+
+    One merge_insert per batch (instead of per file) means fewer Lance commits and
+    fewer small fragments. The per-file Arrow tables are concatenated without copying.
+    """
+    parent_rows = pa.concat_tables([parent_table for _, parent_table, _ in batch])
+    chunk_rows = pa.concat_tables([chunk_table for _, _, chunk_table in batch])
+    # FIX: Atomic Upsert (Prevents data loss if script fails mid-operation)
+    db["parent_videos"].merge_insert(on="md_id") \
+                       .when_matched_update_all() \
+                       .when_not_matched_insert_all() \
+                       .execute(parent_rows)
+    db["video_chunks"].merge_insert(on=["md_id", "chunk_id"]) \
+                      .when_matched_update_all() \
+                      .when_not_matched_insert_all() \
+                      .execute(chunk_rows)
+    print(f"💾 Upserted {parent_rows.num_rows} videos and {chunk_rows.num_rows} chunks")
+
+
+async def write_batch(db: lancedb.LanceDBConnection, batch: List[Tuple[str, pa.Table, pa.Table]], checkpoint: Dict) -> bool:
+    """Write a batch off the event loop, then mark its files processed.
+
+    Files are marked processed only after both tables are written.
+
+    Returns:
+        True if successful, False otherwise
+    """
+    if not batch:
+        return True
+    try:
+        # Lance commits are blocking; a worker thread keeps LLM/embedding calls moving meanwhile
+        await asyncio.to_thread(upsert_rows, db, batch)
+    except Exception as e:
+        print(f"❌ Error writing batch of {len(batch)} files: {e}")
+        record_error(checkpoint, batch[0][0], e)
         return False
 
+    for filename, _, _ in batch:
+        mark_file_processed(checkpoint, filename)
+    save_checkpoint(checkpoint)  # once per batch, not per file
+    return True
+
 
-async def run_ingestion(limit: Optional[int] = None):
+async def run_ingestion(limit: Optional[int] = None, force: bool = False):
     """Run the complete ingestion pipeline.
     
     Args:
         limit: Process only first N files (for testing)
+        force: Re-process files the checkpoint already marks as processed
     """
     from datetime import datetime
     
@@ -388,22 +665,60 @@ async def run_ingestion(limit: Optional[int] = None):
         all_files = all_files[:limit]
         print(f"⚠️  TESTING MODE: Processing only {limit} files")
     
+    # Skip files already processed before scheduling any work (unless forced)
+    done = set() if force else set(checkpoint["processed_files"])
+    to_process = [file for file in all_files if file.name not in done]
+
+    # Files the checkpoint doesn't know about (e.g. it was lost) but whose text is already
+    # stored unchanged are marked processed without any LLM/embedding calls
+    stored_hashes = {} if force or not to_process else load_content_hashes(db)
+    if stored_hashes:
+        file_hashes = await asyncio.gather(*(asyncio.to_thread(hash_file, file) for file in to_process))
+        unchanged = {
+            file.name for file, file_hash in zip(to_process, file_hashes)
+            if stored_hashes.get(generate_md_id(file.name)) == file_hash
+        }
+        if unchanged:
+            for filename in unchanged:
+                mark_file_processed(checkpoint, filename)
+            save_checkpoint(checkpoint)
+            to_process = [file for file in to_process if file.name not in unchanged]
+            print(f"📊 Unchanged since last ingestion: {len(unchanged)} (skipped)")
+
     print(f"📊 Found {total_files} total files")
     print(f"📊 Already processed: {checkpoint['total_processed']}")
-    print(f"📊 Remaining: {total_files - checkpoint['total_processed']}")
+    print(f"📊 Resuming: {len(to_process)} of {len(all_files)} remaining" + (" (--force)" if force else ""))
     
     # Process files
-    successful = 0
+    successful = len(all_files) - len(to_process)
     failed = 0
-    
-    for idx, file in enumerate(all_files, 1):
-        print(f"[{idx}/{len(all_files)}] ", end="")
-        success = await process_single_file(file, db, checkpoint)
-        
-        if success:
-            successful += 1
+
+    # Up to INGEST_CONCURRENCY files are in their LLM/embedding calls at once
+    semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+    async def process(idx: int, file: Path):
+        async with semaphore:
+            # One complete line: other files may be printing concurrently
+            print(f"[{idx}/{len(to_process)}] 📄 Processing: {file.name}")
+            return await process_single_file(file, checkpoint)
+
+    # Each group's write runs while the next group is being processed
+    writes = []  # (write task, number of files in its batch)
+    for start in range(0, len(to_process), WRITE_BATCH_FILES):
+        group = to_process[start:start + WRITE_BATCH_FILES]
+        results = await asyncio.gather(*(process(start + n, file) for n, file in enumerate(group, 1)))
+        pending = [(file.name, *rows) for file, rows in zip(group, results) if rows is not None]
+        failed += len(group) - len(pending)
+        # One write at a time: wait for the previous group's before starting this one
+        if writes:
+            await writes[-1][0]
+        writes.append((asyncio.create_task(write_batch(db, pending, checkpoint)), len(pending)))
+
+    for task, batch_size in writes:
+        if await task:
+            successful += batch_size
         else:
-            failed += 1
+            failed += batch_size
     
     # Final summary
     print("="*70)
@@ -424,6 +739,16 @@ async def run_ingestion(limit: Optional[int] = None):
     print(f"  - parent_videos: {final_parent_table.count_rows()} records")
     print(f"  - video_chunks: {final_chunk_table.count_rows()} records")
 
+    if final_parent_table.count_rows() > 0:
+        # Indexes are built once here, after all writes, on compacted tables
+        compact_tables(db)
+        create_scalar_indexes(db)
+        create_vector_indexes(db)
+
+    # Materialize keyword counts so GET /keywords does no per-request aggregation
+    keyword_total = build_keyword_stats(db)
+    print(f"  - keyword_stats: {keyword_total} unique keywords")
+
 
 # ============================================================================
 # ENTRY POINT
@@ -435,10 +760,12 @@ if __name__ == "__main__":
     
     # Check for test mode
     test_mode = "--test" in sys.argv
+    # --force re-processes everything; by default only files missing from the checkpoint run
+    force = "--force" in sys.argv
     
     if test_mode:
         print("🧪 RUNNING IN TEST MODE (2 files only)")
-        asyncio.run(run_ingestion(limit=2))
+        asyncio.run(run_ingestion(limit=2, force=force))
     else:
         print("⚡ RUNNING FULL INGESTION")
-        asyncio.run(run_ingestion())
+        asyncio.run(run_ingestion(force=force))
@@ -1,16 +1,14 @@
 """Simple script to query and display video metadata (summary + keywords) from LanceDB."""
 
-import lancedb
-from pathlib import Path
-from backend.constants import VECTOR_DATABASE_PATH
+from backend.db import get_parent_table, PARENT_INDEX_COLUMNS
 
 def query_video_by_filename(filename: str):
     """Query video metadata by filename (without .md extension)."""
-    db = lancedb.connect(uri=str(VECTOR_DATABASE_PATH / "transcripts_unified"))
-    parent_table = db["parent_videos"]
+    parent_table = get_parent_table()
     
-    # Search by filename
-    results = parent_table.search().where(f"filename = '{filename}'").to_list()
+    # Search by filename (BTREE-indexed at ingestion)
+    results = parent_table.search().where(f"filename = '{filename}'") \
+        .select(PARENT_INDEX_COLUMNS).limit(1).to_list()
     
     if not results:
         print(f"❌ No video found with filename: {filename}")
@@ -28,10 +26,9 @@ def query_video_by_filename(filename: str):
 
 def list_all_videos():
     """List all ingested videos."""
-    db = lancedb.connect(uri=str(VECTOR_DATABASE_PATH / "transcripts_unified"))
-    parent_table = db["parent_videos"]
+    parent_table = get_parent_table()
     
-    results = parent_table.search().limit(100).to_list()
+    results = parent_table.search().select(["filename", "summary", "keywords"]).limit(100).to_list()
     
     if not results:
         print("❌ No videos found in database.")
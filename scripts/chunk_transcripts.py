@@ -1,5 +1,7 @@
+import os
 import re
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
 from pathlib import Path
 import sys
 import tiktoken  # Add this import
@@ -10,6 +12,9 @@ from data_models import TranscriptGeminiChunk
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+# tiktoken encoder for token counts (loaded once per process)
+ENCODER = tiktoken.get_encoding("cl100k_base")
+
 # Common standalone verbal fillers
 VERBAL_FILLERS_RE = re.compile(r"(?i)\b(basically|actually|sort of|kind of|you know|et cetera)\b")
 # 'So' at the start of paragraphs/lines FIRST (preserve the newlines)
@@ -28,6 +33,13 @@ CONVERSATIONAL_RE = re.compile(
     re.IGNORECASE
     )
 
+# Punctuation fixes (sequential: each one cleans up after the previous)
+REPEATED_PUNCT_RE = re.compile(r'([.!?,])\t*\1+')
+PERIOD_COMMA_RE = re.compile(r'\.\t*,\t*')
+COMMA_PERIOD_RE = re.compile(r',\t*\.\t*')
+PARA_START_PUNCT_RE = re.compile(r'(\n\n+)[ \t]*[.,?!]+[ \t]*')
+
+
 def heavy_clean(text: str) -> str:
     """
     Deep cleaning for LLM context (readability focused).
@@ -38,7 +50,7 @@ def heavy_clean(text: str) -> str:
     - Fix capitalization
     - Remove redundant punctuation
     """
-    # Fillers
+    # Fillers (sequential: a removal can expose a match for a later pass)
     # Remove conversational filler combinations
     text = CONVERSATIONAL_RE.sub("", text)
 
@@ -59,14 +71,14 @@ def heavy_clean(text: str) -> str:
 
     # Fix punctuation issues
     # Remove multiple consecutive punctuation: ".. " or ". ." → "."
-    text = re.sub(r'([.!?,])\t*\1+', r'\1', text)
+    text = REPEATED_PUNCT_RE.sub(r'\1', text)
     
     # Clean up punctuation combinations: "., " or ".  ," → "."
-    text = re.sub(r'\.\t*,\t*', '. ', text)
-    text = re.sub(r',\t*\.\t*', '. ', text)
+    text = PERIOD_COMMA_RE.sub('. ', text)
+    text = COMMA_PERIOD_RE.sub('. ', text)
     
     # Remove stray punctuation at paragraph starts: "\n\n. " or "\n\n, "
-    text = re.sub(r'(\n\n+)[ \t]*[.,?!]+[ \t]*', r'\1', text)
+    text = PARA_START_PUNCT_RE.sub(r'\1', text)
 
     # SPLIT BY PARAGRAPHS (The gaps you want to keep)
     raw_paragraphs = text.split("\n\n")
@@ -90,14 +102,14 @@ def chunk_transcript_two_stream(
     md_id: str,
     chunk_size: int = 300,
     chunk_overlap: int = 50
-) -> List[TranscriptGeminiChunk]:
+) -> Iterator[TranscriptGeminiChunk]:
     """
     Two-stream chunking: raw for vectors, cleaned for LLM.
     
     Process:
     1. Chunk using RecursiveCharacterTextSplitter with tiktoken
     2. Heavy clean each chunk for LLM readability
-    3. Return both versions aligned
+    3. Yield both versions aligned, one chunk at a time
     
     Args:
         raw_text: lightly normalized transcript text
@@ -105,8 +117,8 @@ def chunk_transcript_two_stream(
         chunk_size: Target tokens per chunk (default 300)
         chunk_overlap: Token overlap between chunks (default 50)
     
-    Returns:
-        List of Chunk objects with rawish and cleaned versions
+    Yields:
+        Chunk objects with rawish and cleaned versions
     """
    
     # Step 1: Chunk using tiktoken-aware splitter
@@ -119,41 +131,41 @@ def chunk_transcript_two_stream(
     
     raw_chunks = text_splitter.split_text(raw_text)
     
-    # Initialize tiktoken encoder for accurate token counts
-    encoder = tiktoken.get_encoding("cl100k_base")
-    
-    # Step 2: Create two-stream chunks
-    chunks: List[TranscriptGeminiChunk] = []
+    # Accurate token counts using tiktoken, one batched call for all chunks
+    # (single-threaded: this already runs in one process per core)
+    token_counts = [len(ids) for ids in ENCODER.encode_ordinary_batch(raw_chunks, num_threads=1)]
     
+    # Step 2: Create two-stream chunks (built lazily, so callers never hold them all)
     for chunk_id, raw_chunk in enumerate(raw_chunks):
         # Heavy clean for LLM context
         cleaned_chunk = heavy_clean(raw_chunk)
         
-        # Accurate token count using tiktoken
-        token_count = len(encoder.encode(raw_chunk))
-        
-        chunks.append(TranscriptGeminiChunk(
+        yield TranscriptGeminiChunk(
             md_id=md_id,
             chunk_id=chunk_id,
             raw_content=raw_chunk,
             cleaned_content=cleaned_chunk,
-            token_count=token_count
-        ))
-    
-    return chunks
+            token_count=token_counts[chunk_id]
+        )
 
 
-def write_chunks_as_markdown(chunks: List[TranscriptGeminiChunk], output_dir: Path) -> None:
+def write_chunks_as_markdown(chunks: Iterable[TranscriptGeminiChunk], output_dir: Path) -> Tuple[int, Optional[TranscriptGeminiChunk]]:
     """
     Write chunks to markdown files for inspection (both versions).
     
     Args:
-        chunks: List of Chunk objects
+        chunks: Chunk objects (any iterable; consumed once)
         output_dir: Directory to write .md files
+    
+    Returns:
+        (number of chunks written, first chunk or None)
     """
     output_dir.mkdir(parents=True, exist_ok=True)
     
+    count, first = 0, None
     for chunk in chunks:
+        count += 1
+        first = first or chunk
         out_name = f"{chunk.md_id}_chunk_{chunk.chunk_id:03d}.md"
         out_path = output_dir / out_name
         
@@ -170,6 +182,23 @@ def write_chunks_as_markdown(chunks: List[TranscriptGeminiChunk], output_dir: Pa
         )
         
         out_path.write_text(content, encoding="utf-8")
+    
+    return count, first
+
+
+def process_file(file_path: Path, output_dir: Path) -> Tuple[int, Optional[TranscriptGeminiChunk]]:
+    """Chunk one transcript and write its chunks as they are built (runs in a worker process).
+
+    Only the chunk count and first chunk go back to the parent, not the chunks themselves.
+    """
+    raw_text = file_path.read_text(encoding="utf-8")
+    chunks = chunk_transcript_two_stream(
+        raw_text=raw_text,
+        md_id=file_path.stem,
+        chunk_size=300,
+        chunk_overlap=50
+    )
+    return write_chunks_as_markdown(chunks, output_dir)
 
 
 def main():
@@ -178,36 +207,29 @@ def main():
     IN_DIR = BASE_DIR / "data_cleaned" / "02_normalized"  # Use lightly normalized transcripts
     OUT_DIR = BASE_DIR / "data_cleaned" / "03_chunked"
     
-    all_chunks: List[TranscriptGeminiChunk] = []
-    
-    # Process each transcript
-    for file_path in sorted(IN_DIR.glob("*.md")):
-        raw_text = file_path.read_text(encoding="utf-8")
-        
-        # Get two-stream chunks
-        chunks = chunk_transcript_two_stream(
-            raw_text=raw_text,
-            md_id=file_path.stem,
-            chunk_size=300,
-            chunk_overlap=50
-        )
-        
-        all_chunks.extend(chunks)
-        print(f"✓ {file_path.name}: {len(chunks)} chunks")
+    total_chunks = 0
+    example: Optional[TranscriptGeminiChunk] = None
+    file_paths = sorted(IN_DIR.glob("*.md"))
     
-    # Write debug markdown output
-    write_chunks_as_markdown(all_chunks, OUT_DIR)
+    # Process transcripts in parallel (CPU-bound regex + tokenizer work); map keeps file order.
+    # Each worker writes its own debug markdown, so the corpus is never held in memory at once.
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(process_file, file_paths, [OUT_DIR] * len(file_paths))
+        for file_path, (num_chunks, first_chunk) in zip(file_paths, results):
+            total_chunks += num_chunks
+            example = example or first_chunk
+            print(f"✓ {file_path.name}: {num_chunks} chunks")
     
-    print(f"\n✓ Total chunks: {len(all_chunks)}")
+    print(f"\n✓ Total chunks: {total_chunks}")
     print(f"✓ Debug output written to: {OUT_DIR}")
     
-    return all_chunks
+    return example
 
 
 if __name__ == "__main__":
-    chunks = main()
+    example = main()
     
     # Example: print first chunk as JSON
-    if chunks:
+    if example:
         print("\nExample chunk (JSON):")
-        print(chunks[0].model_dump_json(indent=2))
\ No newline at end of file
+        print(example.model_dump_json(indent=2))
\ No newline at end of file
@@ -3,26 +3,107 @@
 Usage:
 The script creates folders: /unique/` and `/duplicates/` in data_cleaned/01_deduplicated
 and a CSV report.
+With --near-dup, unique files are also clustered by MinHash over word shingles and the
+report's `near_duplicate_of` column names the earliest similar file (files are not moved).
 """
 from pathlib import Path
+import argparse
 import hashlib
+import os
 import shutil
 import csv
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 
 DATA_DIR = Path(__file__).parents[1] / "data"
 OUT_DIR = Path(__file__).parents[1] / "data_cleaned" / "01_deduplicated"
 
 
-def get_file_hash(file_path: Path) -> str:
-    """Get SHA256 hash of normalized file content."""
+# Near-duplicate detection (--near-dup)
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32  # 4 rows per band
+NEAR_DUP_THRESHOLD = 0.8  # estimated Jaccard similarity of the shingle sets
+MINHASH_PRIME = (1 << 31) - 1  # a * hash stays below 2**63 for 32-bit shingle hashes
+_rng = np.random.default_rng(0)
+MINHASH_A = _rng.integers(1, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+MINHASH_B = _rng.integers(0, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalized_text(file_path: Path) -> str:
+    """File text with whitespace collapsed and case folded (Unicode-aware)."""
     text = file_path.read_text(encoding="utf-8")
-    # normalize: strip and collapse whitespace
-    normalized = " ".join(text.split()).strip().lower()
-    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return " ".join(text.split()).lower()
+
+
+def get_file_hash(file_path: Path) -> str:
+    """Get BLAKE2b hash of normalized file content (stdlib, faster than SHA-256 in software)."""
+    return hashlib.blake2b(normalized_text(file_path).encode("utf-8"), digest_size=32).hexdigest()
+
+
+def minhash_signature(file_path: Path) -> np.ndarray:
+    """MinHash signature of the file's word shingles."""
+    words = normalized_text(file_path).split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    return ((np.outer(hashes, MINHASH_A) + MINHASH_B) % MINHASH_PRIME).min(axis=0)
+
 
+def find_near_duplicates(signatures: list) -> dict:
+    """Map index -> index of the earliest signature it nearly matches.
 
-def main():
+    LSH banding finds candidates; each candidate is confirmed on the full signature.
+    """
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    buckets = {}
+    canonical = {}
+    for i, signature in enumerate(signatures):
+        candidates = set()
+        for band in range(LSH_BANDS):
+            bucket = buckets.setdefault((band, signature[band * rows:(band + 1) * rows].tobytes()), [])
+            candidates.update(bucket)
+            bucket.append(i)
+        for j in sorted(candidates):
+            if np.mean(signature == signatures[j]) >= NEAR_DUP_THRESHOLD:
+                canonical[i] = canonical.get(j, j)
+                break
+    return canonical
+
+
+def fast_copy(src: Path, dst: Path) -> None:
+    """Place src at dst as cheaply as the filesystem allows.
+
+    Hardlink first (no bytes copied; outputs are only read downstream), then an
+    in-kernel copy_file_range, then shutil.copy2 across filesystems / other platforms.
+    """
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            remaining = os.fstat(s.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(s.fileno(), d.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        if remaining == 0:
+            shutil.copystat(src, dst)
+            return
+    except (OSError, AttributeError):
+        pass
+    shutil.copy2(src, dst)
+
+
+def main(near_dup: bool = False):
     # Make idempotent: remove existing data_cleaned and recreate
     if OUT_DIR.exists():
         shutil.rmtree(OUT_DIR)
@@ -41,28 +122,43 @@ def main():
     seen_hashes = {}
     report_rows = []
     
-    for file_path in files:
-        file_hash = get_file_hash(file_path)
+    copies = []  # (src, dst)
+    unique_rows = []  # indexes into report_rows
+    
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        # Hashing and copying are I/O bound (hashlib and file syscalls release the GIL),
+        # so both fan out to threads; classification stays in order on this thread
+        hashes = executor.map(get_file_hash, files)
         
-        if file_hash in seen_hashes:
-            # Duplicate - copy to duplicates folder
-            dst = dup_dir / file_path.name
-            shutil.copy2(file_path, dst)
-            canonical_name = seen_hashes[file_hash].name
-            report_rows.append((str(file_path), str(dst), file_hash, f"duplicate_of:{canonical_name}"))
-        else:
-            # Unique - copy to unique folder
-            dst = unique_dir / file_path.name
-            shutil.copy2(file_path, dst)
-            seen_hashes[file_hash] = file_path
-            report_rows.append((str(file_path), str(dst), file_hash, "unique"))
+        for file_path, file_hash in zip(files, hashes):
+            if file_hash in seen_hashes:
+                # Duplicate - copy to duplicates folder
+                dst = dup_dir / file_path.name
+                canonical_name = seen_hashes[file_hash].name
+                report_rows.append((str(file_path), str(dst), file_hash, f"duplicate_of:{canonical_name}"))
+            else:
+                # Unique - copy to unique folder
+                dst = unique_dir / file_path.name
+                seen_hashes[file_hash] = file_path
+                unique_rows.append(len(report_rows))
+                report_rows.append((str(file_path), str(dst), file_hash, "unique"))
+            copies.append((file_path, dst))
+        
+        list(executor.map(lambda pair: fast_copy(*pair), copies))
+
+        near_duplicate_of = {}
+        if near_dup:
+            unique_files = [files[row] for row in unique_rows]
+            signatures = list(executor.map(minhash_signature, unique_files))
+            for i, j in find_near_duplicates(signatures).items():
+                near_duplicate_of[unique_rows[i]] = unique_files[j].name
 
     # Write CSV report
     report_file = OUT_DIR / "data_cleaning_report.csv"
     with report_file.open("w", newline="", encoding="utf-8") as fh:
         writer = csv.writer(fh)
-        writer.writerow(["original_path", "new_path", "hash", "status"])
-        writer.writerows(report_rows)
+        writer.writerow(["original_path", "new_path", "hash", "status", "near_duplicate_of"])
+        writer.writerows((*row, near_duplicate_of.get(i, "")) for i, row in enumerate(report_rows))
 
     unique_count = len(list(unique_dir.glob("*.md")))
     dup_count = len(list(dup_dir.glob("*.md")))
@@ -70,8 +166,13 @@ def main():
     print(f"Done! Processed {len(files)} files:")
     print(f" - {unique_count} unique files → {unique_dir}")
     print(f" - {dup_count} duplicates → {dup_dir}")
+    if near_dup:
+        print(f" - {len(near_duplicate_of)} near-duplicates of other unique files (see report)")
     print(f" - Report: {report_file}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--near-dup", action="store_true", help="Also flag near-duplicate transcripts (MinHash) in the report")
+    args = parser.parse_args()
+    main(near_dup=args.near_dup)
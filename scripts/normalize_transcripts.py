@@ -1,4 +1,6 @@
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import shutil
 
@@ -8,53 +10,72 @@ IN_DIR = BASE_DIR / "data_cleaned" / "01_deduplicated" / "unique"
 OUT_DIR = BASE_DIR / "data_cleaned" / "02_normalized"
 
 # Pre-compile regex for efficiency
-TIMESTAMP_RE = re.compile(r"\[\d{2}:\d{2}:\d{2}\]")
-TILDE_RE = re.compile(r"~~.*?~~")
-SPEAKER_LABEL_RE = re.compile(r"(?i)\*\*Kokchun Giang-\d+:\*\*\s*")  # **Kokchun Giang-N:** format
+# Transcript artifacts in one pass; the named group that matched picks the replacement
+TIMESTAMP = r"\[\d{2}:\d{2}:\d{2}\]"
+TILDE = r"~~.*?~~"
+ARTIFACTS_RE = re.compile(
+    rf"(?P<timestamp>{TIMESTAMP})"
+    rf"|(?P<tilde>{TILDE})"
+    # **Kokchun Giang-N:** format, plus the whitespace after it (timestamps and ~~spans~~
+    # there count as whitespace, as they did when they were replaced by spaces first)
+    rf"|(?P<speaker>(?i:\*\*Kokchun Giang-\d+:\*\*)(?:\s|{TIMESTAMP}|{TILDE})*)"
+)
+ARTIFACT_REPLACEMENTS = {
+    "timestamp": " ",  # replace with space to prevent clumping
+    "tilde": " ",
+    "speaker": "",
+}
 HORIZONTAL_SPACE_RE = re.compile(r"[ \t]+")
+# A whitespace run containing a blank line, i.e. a paragraph gap (plus the paragraphs' edge whitespace)
+PARAGRAPH_BREAK_RE = re.compile(r"\s*\n\n\s*")
+
+
+def _replace_artifact(match: re.Match) -> str:
+    return ARTIFACT_REPLACEMENTS[match.lastgroup]
 
 
 def normalize_text(text: str) -> str:
-    # 1. Remove artifacts (replace with space to prevent clumping)
-    text = TIMESTAMP_RE.sub(" ", text)
-    text = TILDE_RE.sub(" ", text)
-    text = SPEAKER_LABEL_RE.sub("", text)  
+    # 1. Remove artifacts (timestamps, ~~strikethrough~~, speaker labels) in one scan
+    text = ARTIFACTS_RE.sub(_replace_artifact, text)
 
     # 2 Collapse multiple horizontal spaces into one (but preserve newlines)
     text = HORIZONTAL_SPACE_RE.sub(" ", text)
 
-    # 3. SPLIT BY PARAGRAPHS (The gaps you want to keep)
-    raw_paragraphs = text.split("\n\n")
-
-    # 4. The Final Assembly
-    final_blocks = []
-    for para in raw_paragraphs:
-        # Just strip whitespace from each paragraph, don't collapse internal lines
-        clean_para = para.strip()
-        if clean_para:  # Only add non-empty paragraphs
-            final_blocks.append(clean_para)
-            
-    # 5. JOIN PARAGRAPHS WITH DOUBLE NEWLINES
-    # This restores the structural gaps you want to see.
-    return "\n\n".join(final_blocks)
+    # 3. PARAGRAPH GAPS (The gaps you want to keep): each becomes exactly one blank line,
+    # with whitespace stripped around every paragraph (empty paragraphs disappear) and
+    # internal lines left alone
+    return PARAGRAPH_BREAK_RE.sub("\n\n", text).strip()
+
+
+def process_file(file_path: Path) -> None:
+    """Read, normalize and write one transcript (runs in a worker process)."""
+    # Added errors="replace" for safety
+    raw_text = file_path.read_text(encoding="utf-8", errors="replace")
+    normalized_text = normalize_text(raw_text)
+    
+    out_path = OUT_DIR / file_path.name
+    out_path.write_text(normalized_text, encoding="utf-8")
+
 
 def main():
     if not IN_DIR.exists():
         print(f"Error: Source directory {IN_DIR} does not exist. Did you run deduplication?")
         return
 
+    # Move the previous output aside (one rename); it is deleted in the pool while this run
+    # normalizes, together with any stale copies left behind by interrupted runs
     if OUT_DIR.exists():
-        shutil.rmtree(OUT_DIR)
+        OUT_DIR.rename(OUT_DIR.with_name(f".{OUT_DIR.name}.stale-{os.getpid()}"))
+    stale_dirs = list(OUT_DIR.parent.glob(f".{OUT_DIR.name}.stale-*"))
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
     files = list(IN_DIR.glob("*.md"))
-    for file_path in files:
-        # Added errors="replace" for safety
-        raw_text = file_path.read_text(encoding="utf-8", errors="replace")
-        normalized_text = normalize_text(raw_text)
-        
-        out_path = OUT_DIR / file_path.name
-        out_path.write_text(normalized_text, encoding="utf-8")
+    # Files are independent: each worker overlaps its reads/writes with the others' regex work
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        cleanups = [executor.submit(shutil.rmtree, stale_dir, ignore_errors=True) for stale_dir in stale_dirs]
+        list(executor.map(process_file, files, chunksize=16))
+        for cleanup in cleanups:
+            cleanup.result()
     
     print(f"Normalization complete. Processed {len(files)} files into {OUT_DIR}")
 